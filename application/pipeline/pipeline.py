@@ -7,6 +7,7 @@ from typing import List, Optional, Protocol
 
 from application.services.build_tree_service import Node
 from config.settings import Settings
+from infrastructure.bc3.bc3_index import Bc3Index
 
 
 @dataclass
@@ -14,8 +15,11 @@ class ETLContext:
     settings: Settings
     original_path: Optional[Path] = None
     modified_path: Optional[Path] = None
+    index: Optional[Bc3Index] = None
     roots: Optional[List[Node]] = None
     csv_path: Optional[Path] = None
+    columnar_path: Optional[Path] = None
+    xlsx_path: Optional[Path] = None
 
 
 class Step(Protocol):
@@ -1,12 +1,19 @@
 # application/pipeline/steps.py
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass
+from typing import Optional, Tuple
 
 from application.pipeline.pipeline import ETLContext, Step
 from application.services.build_tree_service import build_tree
+from application.services.export_columnar_service import export_columnar
 from application.services.export_csv_service import export_to_csv
+from application.services.export_xlsx_service import export_to_xlsx
+from application.services.phase1_service import run_phase1
+from application.services.tree_render_service import render_tree
 from infrastructure.bc3.bc3_modifier import convert_to_material
+from infrastructure.bc3.bc3_snapshot import load_bc3_index
 
 
 @dataclass
@@ -25,9 +32,10 @@ class TransformBC3Step(Step):
         out_dir = ctx.settings.output_dir
         out_dir.mkdir(parents=True, exist_ok=True)
         mod_file = out_dir / "presupuesto_material.bc3"
+        index = load_bc3_index(ctx.original_path, jobs=ctx.settings.bc3_jobs)
 
         try:
-            convert_to_material(
+            ctx.index = convert_to_material(
                 src=ctx.original_path,
                 dst=mod_file,
                 max_code_len=ctx.settings.max_code_len,
@@ -36,7 +44,7 @@ class TransformBC3Step(Step):
                 encoding=ctx.settings.encoding,
             )
         except TypeError:
-            convert_to_material(ctx.original_path, mod_file)
+            ctx.index = convert_to_material(ctx.original_path, mod_file, index=index)
 
         ctx.modified_path = mod_file
         print(f"BC3 modificado  →  {mod_file.resolve()}")
@@ -54,29 +62,54 @@ class BuildTreeStep(Step):
                 encoding=ctx.settings.encoding,
             )
         except TypeError:
-            roots = build_tree(ctx.modified_path)
+            roots = build_tree(ctx.index or ctx.modified_path)
         ctx.roots = roots
 
 
+@dataclass
+class Phase1Step(Step):
+    """`TransformBC3Step` + `BuildTreeStep` escribiendo el BC3 una sola vez."""
+
+    def run(self, ctx: ETLContext) -> None:
+        assert ctx.original_path is not None
+        out_dir = ctx.settings.output_dir
+        out_dir.mkdir(parents=True, exist_ok=True)
+        mod_file = out_dir / "presupuesto_material.bc3"
+        index = load_bc3_index(ctx.original_path, jobs=ctx.settings.bc3_jobs)
+
+        result = run_phase1(ctx.original_path, mod_file, index=index)
+        ctx.index = result.index
+        ctx.roots = result.roots
+        ctx.modified_path = mod_file
+        print(f"BC3 modificado  →  {mod_file.resolve()}")
+
+
 @dataclass
 class PrintTreeStep(Step):
+    """
+    Imprime el árbol con una sola escritura a consola. `max_depth`,
+    `max_nodes` y `subtrees` (códigos) acotan lo que se muestra.
+    """
+
+    max_depth: Optional[int] = None
+    max_nodes: Optional[int] = None
+    subtrees: Tuple[str, ...] = ()
+
     def run(self, ctx: ETLContext) -> None:
+        # Se imprime el árbol que ya ha montado `Phase1Step` (clones, BC3 y
+        # exports lo necesitan entero): un `LazyTree` sería trabajo de más.
         assert ctx.roots is not None
-        print("\n=== ÁRBOL DE CONCEPTOS ===")
-        for root in ctx.roots:
-            self._print_tree(root)
-        print("=== FIN DEL ÁRBOL ===\n")
-
-    def _print_tree(self, node, indent: int = 0) -> None:
-        spacer = " " * indent
-        print(
-            f"{spacer}- [{node.kind.upper():12}] "
-            f"{node.code:<15} "
-            f"{(node.unidad or '').ljust(5)} "
-            f"{node.description}"
+        lines = render_tree(
+            ctx.roots,
+            max_depth=self.max_depth,
+            max_nodes=self.max_nodes,
+            subtrees=self.subtrees,
+        )
+        sys.stdout.write(
+            "\n=== ÁRBOL DE CONCEPTOS ===\n"
+            + "".join(line + "\n" for line in lines)
+            + "=== FIN DEL ÁRBOL ===\n\n"
         )
-        for child in sorted(node.children, key=lambda n: n.code):
-            self._print_tree(child, indent + 4)
 
 
 @dataclass
@@ -90,3 +123,22 @@ class ExportCsvStep(Step):
             export_to_csv(ctx.roots, csv_path)
         ctx.csv_path = csv_path
         print(f"CSV generado    →  {csv_path.resolve()}\n")
+
+
+@dataclass
+class ExportColumnarStep(Step):
+    def run(self, ctx: ETLContext) -> None:
+        assert ctx.roots is not None
+        target = ctx.settings.output_dir / ctx.settings.columnar_filename
+        ctx.columnar_path = export_columnar(ctx.roots, target)
+        print(f"Columnar        →  {ctx.columnar_path.resolve()}\n")
+
+
+@dataclass
+class ExportXlsxStep(Step):
+    def run(self, ctx: ETLContext) -> None:
+        assert ctx.roots is not None
+        xlsx_path = ctx.settings.output_dir / ctx.settings.xlsx_filename
+        export_to_xlsx(ctx.roots, xlsx_path)
+        ctx.xlsx_path = xlsx_path
+        print(f"XLSX generado   →  {xlsx_path.resolve()}\n")
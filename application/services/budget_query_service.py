@@ -0,0 +1,128 @@
+# application/services/budget_query_service.py
+from __future__ import annotations
+
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional
+
+from application.services.build_tree_service import iter_postorder
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+_EMPTY = array("l")
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin tildes: "Hormigón" y "hormigon" son el mismo término."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+class BudgetQueryIndex:
+    """
+    Índice de consulta sobre los nodos de un árbol (`Node` o `LazyNode`).
+
+    - Prefijo de código: los códigos se guardan ordenados, así que todos los
+      que empiezan por un prefijo forman un rango contiguo (dos búsquedas
+      binarias, como bajar por un trie).
+    - Términos: índice invertido de `description` + `long_desc` tokenizados
+      (minúsculas, sin tildes). Cada término apunta a las posiciones de sus
+      nodos en ese mismo orden de código.
+
+    Todas las consultas devuelven nodos ordenados por código, uno por código.
+    """
+
+    def __init__(self, nodes: Iterable[Any]) -> None:
+        by_code: Dict[str, Any] = {}
+        for node in nodes:
+            by_code.setdefault(node.code, node)
+        self.codes: List[str] = sorted(by_code)
+        self.nodes: List[Any] = [by_code[code] for code in self.codes]
+
+        postings: Dict[str, array] = {}
+        for pos, node in enumerate(self.nodes):
+            text = node.description
+            if node.long_desc:
+                text = f"{text} {node.long_desc}"
+            for term in set(tokenize(text)):
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = array("l")
+                posting.append(pos)
+        self.postings = postings
+
+    @classmethod
+    def from_roots(cls, roots: Iterable[Any]) -> "BudgetQueryIndex":
+        return cls(iter_postorder(roots))
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def get(self, code: str) -> Optional[Any]:
+        pos = bisect_left(self.codes, code)
+        if pos < len(self.codes) and self.codes[pos] == code:
+            return self.nodes[pos]
+        return None
+
+    def _prefix_range(self, prefix: str) -> range:
+        lo = bisect_left(self.codes, prefix)
+        # Ningún código puede pasar de prefix + "\U0010ffff" sin dejar de
+        # empezar por prefix.
+        hi = bisect_left(self.codes, prefix + "\U0010ffff", lo)
+        return range(lo, hi)
+
+    def prefix(self, prefix: str) -> List[Any]:
+        span = self._prefix_range(prefix)
+        return self.nodes[span.start : span.stop]
+
+    def term(self, word: str) -> List[Any]:
+        """Nodos cuya descripción contiene el término `word` (exacto)."""
+        terms = tokenize(word)
+        if len(terms) != 1:
+            return self.search(word)
+        return [self.nodes[pos] for pos in self.postings.get(terms[0], _EMPTY)]
+
+    def terms_with_prefix(self, prefix: str) -> List[str]:
+        folded = fold(prefix)
+        return sorted(term for term in self.postings if term.startswith(folded))
+
+    def search(self, text: str = "", *, code_prefix: str = "") -> List[Any]:
+        """
+        AND de todos los términos de `text` y, si se da, del prefijo de
+        código. Sin términos ni prefijo no devuelve nada.
+        """
+        terms = set(tokenize(text))
+        span = self._prefix_range(code_prefix) if code_prefix else None
+        if not terms:
+            return self.nodes[span.start : span.stop] if span is not None else []
+
+        postings = sorted(
+            (self.postings.get(term, _EMPTY) for term in terms),
+            key=len,
+        )
+        # Manda la lista más corta (recortada al rango del prefijo); del resto
+        # solo se comprueba la pertenencia por búsqueda binaria.
+        candidates = postings[0]
+        if span is not None:
+            candidates = candidates[
+                bisect_left(candidates, span.start) : bisect_left(candidates, span.stop)
+            ]
+        rest = postings[1:]
+        return [
+            self.nodes[pos]
+            for pos in candidates
+            if all(_contains(other, pos) for other in rest)
+        ]
+
+
+def _contains(posting: array, pos: int) -> bool:
+    i = bisect_left(posting, pos)
+    return i < len(posting) and posting[i] == pos
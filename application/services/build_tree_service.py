@@ -1,15 +1,20 @@
 # application/services/build_tree_service.py
 from __future__ import annotations
 
-import re
+import logging
+import os
 from collections import defaultdict
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from utils.text_sanitize import clean_text
+from infrastructure.bc3.bc3_graph import Bc3Graph
+from infrastructure.bc3.bc3_index import Bc3Index
+from infrastructure.bc3.bc3_snapshot import load_bc3_index, store_bc3_index
+from infrastructure.bc3.bc3_writer import Bc3Writer
+from utils.text_sanitize import clean_text, clean_text_many
 
-_NUM = re.compile(r"^-?\d+(?:[.,]\d+)?$")
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -24,19 +29,110 @@ class Node:
     imp_pres: float | None = None
     measurements: List[str] = field(default_factory=list)
     children: List["Node"] = field(default_factory=list)
+    # Suma de importes de lo que cuelga de un capítulo/supercapítulo.
+    importe_total: float | None = None
+    # Padres distintos, en orden de enlace.
+    parents: List["Node"] = field(default_factory=list, repr=False, compare=False)
+    # Primer hijo con cada código.
+    _children_by_code: Dict[str, "Node"] = field(
+        default_factory=dict,
+        init=False,
+        repr=False,
+        compare=False,
+    )
 
     def add_child(self, child: "Node") -> None:
         self.children.append(child)
+        self._children_by_code.setdefault(child.code, child)
+        if not any(parent is self for parent in child.parents):
+            child.parents.append(self)
 
-    def compute_total(self) -> None:
+    def child_by_code(self, code: str) -> "Node | None":
+        return self._children_by_code.get(code)
+
+    def compute_own_total(self) -> None:
         if (
             self.imp_pres is None
             and self.precio is not None
             and self.can_pres is not None
         ):
             self.imp_pres = self.precio * self.can_pres
-        for child in self.children:
-            child.compute_total()
+
+    def compute_total(self) -> None:
+        """`imp_pres` de este nodo y de todo lo que cuelga de él (sin recursión)."""
+        for node in iter_postorder([self]):
+            node.compute_own_total()
+
+
+_ROLLUP_KINDS = {"capítulo", "supercapítulo"}
+
+
+def iter_postorder(roots: Iterable[Node]) -> Iterator[Node]:
+    """
+    Hijos antes que padres, cada nodo una sola vez (aunque cuelgue de varios
+    padres) y sin recursión. Si hay un ciclo, la arista que lo cierra se
+    ignora.
+    """
+    seen: set[int] = set()
+    for root in roots:
+        if id(root) in seen:
+            continue
+        seen.add(id(root))
+        stack = [(root, iter(root.children))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append((child, iter(child.children)))
+                    break
+            else:
+                stack.pop()
+                yield node
+
+
+def iter_preorder(roots: Iterable[Node]) -> Iterator[Tuple[Node, int]]:
+    """
+    Filas del árbol aplanado en preorden: `(nodo, fila del padre)`, con -1
+    en las raíces. Un nodo con varios padres sale bajo cada uno; un nodo que
+    ya está en la rama actual (ciclo) no se vuelve a bajar.
+    """
+    row = 0
+    for root in roots:
+        on_path: set[int] = set()
+        stack: List[Tuple[Node, int, bool]] = [(root, -1, False)]
+        while stack:
+            current, parent_row, leaving = stack.pop()
+            if leaving:
+                on_path.discard(id(current))
+                continue
+            if id(current) in on_path:
+                continue
+            yield current, parent_row
+            on_path.add(id(current))
+            stack.append((current, parent_row, True))
+            stack.extend((child, row, False) for child in reversed(current.children))
+            row += 1
+
+
+def roll_up_totals(nodes: Iterable[Node], exclude: Collection[str] = ()) -> None:
+    """
+    `importe_total` de capítulos y supercapítulos: suma de los `importe_total`
+    de los capítulos hijos y de los `imp_pres` del resto de hijos, en una
+    sola pasada de abajo arriba. Los códigos de `exclude` (los que están en
+    un ciclo) se quedan sin total y no suman en sus padres.
+    """
+    for node in iter_postorder(nodes):
+        if node.kind not in _ROLLUP_KINDS or node.code in exclude:
+            continue
+        total = 0.0
+        for child in node.children:
+            if child.code in exclude:
+                continue
+            value = child.importe_total if child.kind in _ROLLUP_KINDS else child.imp_pres
+            if value is not None:
+                total += value
+        node.importe_total = total
 
 
 def _kind(code: str, type_code: str) -> str:
@@ -52,8 +148,18 @@ def _kind(code: str, type_code: str) -> str:
     }.get(type_code, "otro")
 
 
-def _num(value: str) -> float | None:
-    return float(value.replace(",", ".")) if value and _NUM.match(value) else None
+def _description(code: str, type_code: str, desc_short: str) -> str:
+    return _description_of_clean(code, type_code, clean_text(desc_short))
+
+
+def _description_of_clean(code: str, type_code: str, desc_clean: str) -> str:
+    if (
+        type_code in {"0", "1", "2", "3"}
+        and "#" not in code
+        and not desc_clean.strip()
+    ):
+        return code
+    return desc_clean
 
 
 def _fmt_price_str(value: float | None) -> str:
@@ -62,14 +168,15 @@ def _fmt_price_str(value: float | None) -> str:
     return f"{value:.15g}".replace(",", ".")
 
 
-def _add_missing_clones(nodes: Dict[str, "Node"]) -> None:
-    parent_of = {child.code: parent.code for parent in nodes.values() for child in parent.children}
-    roots = [node for node in nodes.values() if node.code not in parent_of]
-
-    def dfs(node: Node) -> None:
-        for child in node.children:
-            dfs(child)
+def _add_missing_clones(
+    nodes: Dict[str, "Node"],
+    graph: Bc3Graph,
+    roots: Dict[str, "Node"],
+) -> Dict[str, str]:
+    """Añade los clones "<código>.1"; devuelve clon -> partida de origen."""
+    clones: Dict[str, str] = {}
 
+    def visit(node: Node) -> None:
         if node.kind == "partida" and not node.children:
             _create_clone(node)
 
@@ -83,7 +190,7 @@ def _add_missing_clones(nodes: Dict[str, "Node"]) -> None:
 
     def _create_clone(parent: Node) -> None:
         clone_code = (parent.code + ".1")[:20]
-        if any(child.code == clone_code for child in parent.children):
+        if parent.child_by_code(clone_code) is not None:
             return
         clone_price = parent.precio if parent.precio is not None else 1.0
         clone = Node(
@@ -96,158 +203,349 @@ def _add_missing_clones(nodes: Dict[str, "Node"]) -> None:
             can_pres=1.0,
             imp_pres=None,
         )
-        clone.compute_total()
-        parent.add_child(clone)
-
-    for root in roots:
-        dfs(root)
-
-
-def _rewrite_bc3(path: Path, nodes: Dict[str, Node]) -> None:
-    lines = path.read_text("latin-1", errors="ignore").splitlines(keepends=True)
-    existing_c_codes: set[str] = set()
-    for raw in lines:
-        if raw.startswith("~C|"):
-            try:
-                _, rest = raw.split("|", 1)
-                code = rest.split("|", 1)[0]
-                existing_c_codes.add(code)
-            except Exception:
-                pass
-
-    out: list[str] = []
+        clone.compute_own_total()
+        _link(parent, clone, roots)
+        if clone_code not in nodes:
+            # Si el código ya es de otro concepto (o, truncado a 20, el de la
+            # propia partida) el BC3 no gana ningún clon.
+            clones[clone_code] = parent.code
+
+    # Hijos antes que padres; cada nodo una vez aunque cuelgue de varios
+    # padres, y sin recursión (presupuestos profundos o con ciclos).
+    codes = graph.store.codes
+    for cid in graph.postorder(graph.roots()):
+        visit(nodes[codes[cid]])
+    return clones
+
+
+def _link(parent: Node, child: Node, roots: Dict[str, Node]) -> None:
+    """Enlaza `child` bajo `parent`; un código que aparece como hijo deja de ser raíz."""
+    parent.add_child(child)
+    roots.pop(child.code, None)
+
+
+def _has_clones(node: Node | None, clones: Dict[str, str]) -> bool:
+    return (
+        node is not None
+        and node.kind == "partida"
+        and any(clones.get(child.code) == node.code for child in node.children)
+    )
+
+
+def _rewrite_bc3(index: Bc3Index, nodes: Dict[str, Node], clones: Dict[str, str]) -> None:
+    if index.buffer.find(b"\r") < 0 and not clones:
+        # Sin clones el contenido no cambia: solo se escribe si aún no está en
+        # disco (fase 1 fusionada) o si hay que pasar a saltos del sistema.
+        if not index.is_fresh() or os.linesep != "\n":
+            index.write()
+        store_bc3_index(index)
+        return
+
+    existing_c_codes = index.concepts
+
+    out = Bc3Writer()
     done: set[str] = set()
+    written = dict(index.clones)
 
-    for line in lines:
-        if line.startswith("~C|"):
-            _, rest = line.split("|", 1)
+    for rec_no in range(len(index)):
+        if index.record_tag(rec_no) == "~C" and _has_clones(
+            nodes.get(index.record_field(rec_no, 1)), clones
+        ):
+            _, rest = index.record(rec_no).split("|", 1)
             parts = rest.rstrip("\n").split("|")
             while len(parts) < 6:
                 parts.append("")
 
-            code = parts[0]
-            node = nodes.get(code)
+            node = nodes[parts[0]]
+            parts[5] = "0"
+            out.write("~C|" + "|".join(parts) + "|\n")
 
-            if node and node.kind == "partida" and any(
-                child.code.endswith(".1")
-                for child in node.children
-            ):
-                parts[5] = "0"
-                out.append("~C|" + "|".join(parts) + "|\n")
+            for clone in node.children:
+                if clones.get(clone.code) != node.code:
+                    continue
+                if clone.code in done:
+                    continue
+                if clone.code in existing_c_codes:
+                    done.add(clone.code)
+                    continue
 
-                for clone in node.children:
-                    if not clone.code.endswith(".1"):
-                        continue
-                    if clone.code in done:
-                        continue
-                    if clone.code in existing_c_codes:
-                        done.add(clone.code)
-                        continue
+                clone_parts = parts.copy()
+                clone_parts[0] = clone.code
 
-                    clone_parts = parts.copy()
-                    clone_parts[0] = clone.code
+                parent_price_str = parts[3] if len(parts) > 3 else ""
+                if parent_price_str and parent_price_str.strip():
+                    clone_price_str = parent_price_str.strip()
+                else:
+                    clone_price_str = _fmt_price_str(clone.precio) or "1"
+                clone_parts[3] = clone_price_str
 
-                    parent_price_str = parts[3] if len(parts) > 3 else ""
-                    if parent_price_str and parent_price_str.strip():
-                        clone_price_str = parent_price_str.strip()
-                    else:
-                        clone_price_str = _fmt_price_str(clone.precio) or "1"
-                    clone_parts[3] = clone_price_str
+                parent_date_str = parts[4] if len(parts) > 4 else ""
+                clone_parts[4] = (
+                    parent_date_str.strip() if parent_date_str else "1"
+                )
+                clone_parts[5] = "3"
 
-                    parent_date_str = parts[4] if len(parts) > 4 else ""
-                    clone_parts[4] = (
-                        parent_date_str.strip() if parent_date_str else "1"
-                    )
-                    clone_parts[5] = "3"
+                out.write("~C|" + "|".join(clone_parts) + "|\n")
+                out.write(f"~D|{node.code}|{clone.code}\\1\\1\\1|\n")
+                done.add(clone.code)
+                written[clone.code] = node.code
+            continue
 
-                    out.append("~C|" + "|".join(clone_parts) + "|\n")
-                    out.append(f"~D|{node.code}|{clone.code}\\1\\1\\1|\n")
-                    done.add(clone.code)
-                continue
+        out.copy(index.raw_record(rec_no))
 
-        out.append(line)
+    index.reload(out.getvalue())
+    # `reload` empieza de cero: se apuntan los clones que lleva ahora el
+    # contenido (los de antes y los recién escritos) para `LazyTree`.
+    index.clones = written
+    index.write()
+    store_bc3_index(index)
 
-    path.write_text("".join(out), "latin-1", errors="ignore")
 
+def build_tree(bc3: Path | Bc3Index) -> List[Node]:
+    index = bc3 if isinstance(bc3, Bc3Index) else load_bc3_index(Path(bc3))
 
-def build_tree(bc3_path: Path) -> List[Node]:
     nodes: Dict[str, Node] = {}
-    parent_children: Dict[str, List[str]] = defaultdict(list)
     qty_map: Dict[str, float] = {}
     meas_map: Dict[str, List[str]] = defaultdict(list)
 
-    with bc3_path.open("r", encoding="latin-1", errors="ignore") as fh:
-        for raw in fh:
-            tag = raw[:2]
-
-            if tag == "~C":
-                _, rest = raw.split("|", 1)
-                parts = rest.rstrip("\n").split("|")
-                while len(parts) < 6:
-                    parts.append("")
-                code, unidad, desc, pres, _, type_code = parts[:6]
-
-                desc_clean = clean_text(desc)
-                if (
-                    type_code in {"0", "1", "2", "3"}
-                    and "#" not in code
-                    and not desc_clean.strip()
-                ):
-                    desc_clean = code
-
-                nodes[code] = Node(
-                    code=code,
-                    description=desc_clean,
-                    kind=_kind(code, type_code),
-                    unidad=unidad or None,
-                    precio=_num(pres),
-                )
+    concepts = list(index.iter_concepts())
+    descriptions = clean_text_many(concept.desc_short for concept in concepts)
+    for concept, desc_clean in zip(concepts, descriptions):
+        code = concept.code
+        type_code = concept.tipo
+
+        nodes[code] = Node(
+            code=code,
+            description=_description_of_clean(code, type_code, desc_clean),
+            kind=_kind(code, type_code),
+            unidad=concept.unidad or None,
+            precio=concept.precio,
+        )
 
-            elif tag == "~T":
-                _, rest = raw.split("|", 1)
-                try:
-                    code, txt = rest.rstrip("\n").split("|", 1)
-                except ValueError:
-                    code, txt = rest.rstrip("\n"), ""
-                if code in nodes and nodes[code].long_desc is None:
-                    nodes[code].long_desc = clean_text(txt)
-
-            elif tag == "~D":
-                _, rest = raw.split("|", 1)
-                parent_code, child_part = rest.split("|", 1)
-                chunks = child_part.rstrip("|\n").split("\\")
-
-                for i in range(0, len(chunks), 3):
-                    child_code = chunks[i].strip()
-                    if child_code:
-                        parent_children[parent_code].append(child_code)
-                        canp = chunks[i + 2] if i + 2 < len(chunks) else ""
-                        if _NUM.match(canp):
-                            qty_map[child_code] = float(
-                                canp.replace(",", ".")
-                            )
-
-            elif tag == "~M":
-                body = raw.split("|", 2)[1]
-                if "\\" in body:
-                    code = body.split("\\", 1)[1].split("|", 1)[0]
-                    meas_map[code].append(raw.rstrip())
-
-    for parent, children in parent_children.items():
-        for child_code in children:
-            if parent in nodes and child_code in nodes:
-                nodes[parent].add_child(nodes[child_code])
+    text_codes: List[str] = []
+    raw_texts: List[str] = []
+    for code, txt in index.iter_texts():
+        text_codes.append(code)
+        raw_texts.append(txt)
+    for code, long_desc in zip(text_codes, clean_text_many(raw_texts)):
+        nodes[code].long_desc = long_desc
+
+    for parent_code, child_code, qty in index.iter_edges():
+        if qty is not None:
+            qty_map[child_code] = qty
+
+    for _parent, child_code, record in index.iter_measurements():
+        meas_map[child_code].append(record.rstrip())
+
+    graph = Bc3Graph.from_store(index.store, concepts_only=True)
+    # Los recorridos ignoran la arista que cierra un ciclo, así que el árbol
+    # sale igual; pero la suma de un ciclo no tiene sentido: se avisa y esos
+    # conceptos quedan fuera de los totales.
+    cyclic = set(graph.cyclic_codes())
+    if cyclic:
+        logger.warning(
+            "Descomposición cíclica en el BC3 (%d conceptos, sin importe total): %s",
+            len(cyclic),
+            ", ".join(sorted(cyclic)),
+        )
+    codes = index.store.codes
+    roots: Dict[str, Node] = dict(nodes)
+    for cid in index.store.order:
+        parent = nodes[codes[cid]]
+        for child in graph.children(cid):
+            _link(parent, nodes[codes[child]], roots)
 
     for code, node in nodes.items():
         if code in qty_map:
             node.can_pres = qty_map[code]
         if code in meas_map:
             node.measurements = meas_map[code]
-        node.compute_total()
-
-    _add_missing_clones(nodes)
-    _rewrite_bc3(bc3_path, nodes)
-
-    child_codes = {child.code for node in nodes.values() for child in node.children}
-    roots = [node for node in nodes.values() if node.code not in child_codes]
-    return sorted(roots, key=lambda node: node.code)
+        node.compute_own_total()
+
+    clones = _add_missing_clones(nodes, graph, roots)
+    _rewrite_bc3(index, nodes, clones)
+    roll_up_totals(nodes.values(), exclude=cyclic)
+
+    return sorted(roots.values(), key=lambda node: node.code)
+
+
+# ---------------------------------------------------------------- árbol perezoso
+
+_UNSET: Any = object()
+
+
+class LazyTree:
+    """
+    Árbol de conceptos sobre un `Bc3Index` ya parseado, sin copiarlo.
+
+    Los nodos (`LazyNode`) se crean al pedirlos y solo decodifican del buffer
+    lo que se lee: hijos, descripción larga y mediciones no existen hasta que
+    alguien accede a ellos. Mismos campos y valores que `build_tree`, pero
+    sobre el BC3 tal cual (no crea clones ni reescribe el fichero): pensado
+    para leer la salida de la fase 1, que ya los lleva (p. ej. `diff_bc3`).
+    """
+
+    def __init__(self, index: Bc3Index) -> None:
+        self.index = index
+        self.graph = Bc3Graph.from_store(index.store, concepts_only=True)
+        self._nodes: Dict[int, LazyNode] = {}
+        self._qty: Optional[Dict[int, float]] = None
+        self._totals: Dict[int, float] = {}
+
+    def node(self, cid: int) -> "LazyNode":
+        node = self._nodes.get(cid)
+        if node is None:
+            node = self._nodes[cid] = LazyNode(self, cid)
+        return node
+
+    def get(self, code: str) -> "LazyNode | None":
+        cid = self.index.store.id_of(code)
+        return self.node(cid) if self.index.store.is_concept(cid) else None
+
+    def roots(self) -> List["LazyNode"]:
+        codes = self.index.store.codes
+        return [self.node(cid) for cid in sorted(self.graph.roots(), key=codes.__getitem__)]
+
+    def clone_source(self, cid: int) -> int | None:
+        """Partida de la que `cid` es clon, si lo escribió la fase 1 (`Bc3Index.clones`)."""
+        store = self.index.store
+        source = self.index.clones.get(store.code_of(cid))
+        return None if source is None else store.id_of(source)
+
+    def can_pres(self, cid: int) -> float | None:
+        if self._qty is None:
+            # Como en `build_tree`: la última cantidad numérica del hijo en
+            # cualquier ~D del fichero.
+            store = self.index.store
+            self._qty = {
+                child: qty
+                for child, qty in zip(store.edge_child, store.edge_qty)
+                if qty == qty
+            }
+        return self._qty.get(cid)
+
+    def importe_total(self, cid: int) -> float | None:
+        # Como `roll_up_totals`: lo que está en un ciclo no tiene total.
+        cyclic = self.graph.cyclic()
+        if _kind_of(self.index.store, cid) not in _ROLLUP_KINDS or cyclic[cid]:
+            return None
+        if cid not in self._totals:
+            # Solo el subárbol de `cid`, de abajo arriba y una vez por nodo.
+            store = self.index.store
+            for sub in self.graph.postorder([cid]):
+                if (
+                    sub in self._totals
+                    or cyclic[sub]
+                    or _kind_of(store, sub) not in _ROLLUP_KINDS
+                ):
+                    continue
+                total = 0.0
+                for child in self.graph.children(sub):
+                    if cyclic[child]:
+                        continue
+                    if _kind_of(store, child) in _ROLLUP_KINDS:
+                        value = self._totals.get(child)
+                    else:
+                        value = self.node(child).imp_pres
+                    if value is not None:
+                        total += value
+                self._totals[sub] = total
+        return self._totals[cid]
+
+
+def _kind_of(store: Any, cid: int) -> str:
+    return _kind(store.code_of(cid), store.tipo_of(cid))
+
+
+class LazyNode:
+    """Vista de un concepto con la interfaz de lectura de `Node`."""
+
+    __slots__ = ("_tree", "cid", "_children", "_description", "_long_desc", "_measurements")
+
+    def __init__(self, tree: LazyTree, cid: int) -> None:
+        self._tree = tree
+        self.cid = cid
+        self._children: Any = _UNSET
+        self._description: Any = _UNSET
+        self._long_desc: Any = _UNSET
+        self._measurements: Any = _UNSET
+
+    @property
+    def code(self) -> str:
+        return self._tree.index.store.code_of(self.cid)
+
+    @property
+    def kind(self) -> str:
+        return _kind_of(self._tree.index.store, self.cid)
+
+    @property
+    def unidad(self) -> str | None:
+        return self._tree.index.store.unit_of(self.cid) or None
+
+    @property
+    def precio(self) -> float | None:
+        return self._tree.index.store.price_of(self.cid)
+
+    @property
+    def can_pres(self) -> float | None:
+        return self._tree.can_pres(self.cid)
+
+    @property
+    def imp_pres(self) -> float | None:
+        precio, can_pres = self.precio, self.can_pres
+        if precio is None or can_pres is None:
+            return None
+        return precio * can_pres
+
+    @property
+    def importe_total(self) -> float | None:
+        return self._tree.importe_total(self.cid)
+
+    @property
+    def description(self) -> str:
+        if self._description is _UNSET:
+            concept = self._tree.index.concepts.view(self.cid)
+            self._description = _description(concept.code, concept.tipo, concept.desc_short)
+        return self._description
+
+    @property
+    def long_desc(self) -> str | None:
+        if self._long_desc is _UNSET:
+            text = self._tree.index.text(self.code)
+            if text is not None:
+                self._long_desc = clean_text(text)
+            else:
+                # Los clones que escribe la fase 1 no llevan ~T: como en
+                # `_add_missing_clones`, heredan el de la partida de origen.
+                source = self._tree.clone_source(self.cid)
+                self._long_desc = None if source is None else self._tree.node(source).long_desc
+        return self._long_desc
+
+    @property
+    def measurements(self) -> List[str]:
+        if self._measurements is _UNSET:
+            self._measurements = [
+                record.rstrip() for record in self._tree.index.measurement_records(self.cid)
+            ]
+        return self._measurements
+
+    @property
+    def children(self) -> List["LazyNode"]:
+        if self._children is _UNSET:
+            node = self._tree.node
+            self._children = [node(child) for child in self._tree.graph.children(self.cid)]
+        return self._children
+
+    def child_codes(self) -> List[str]:
+        """Códigos de los hijos sin crear sus nodos."""
+        codes = self._tree.index.store.codes
+        return [codes[child] for child in self._tree.graph.children(self.cid)]
+
+    def __repr__(self) -> str:
+        return f"LazyNode({self.code!r}, kind={self.kind!r})"
+
+
+def build_lazy_tree(bc3: Path | Bc3Index) -> List[LazyNode]:
+    """Raíces (por código) de un `LazyTree` sobre el BC3 tal como está escrito."""
+    index = bc3 if isinstance(bc3, Bc3Index) else load_bc3_index(Path(bc3))
+    return LazyTree(index).roots()
@@ -0,0 +1,150 @@
+# application/services/export_columnar_service.py
+from __future__ import annotations
+
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+from application.services.build_tree_service import Node, iter_preorder
+
+# Mismas filas y columnas que el CSV; `hijos` se sustituye por `fila_padre`
+# (posición de la fila del padre, -1 en las raíces).
+TEXT_COLUMNS = (
+    "tipo",
+    "codigo",
+    "descripcion_corta",
+    "descripcion_larga",
+    "unidad",
+    "mediciones",
+)
+FLOAT_COLUMNS = ("precio", "cantidad_pres", "importe_pres", "importe_total")
+PARENT_COLUMN = "fila_padre"
+
+_ARROW_SUFFIXES = {".parquet", ".feather", ".arrow"}
+_NPZ_SUFFIX = ".npz"
+_OFFSETS = "__offsets"
+_UTF8 = "__utf8"
+
+
+def tree_columns(roots: Iterable[Node]) -> Dict[str, List[Any]]:
+    """Árbol aplanado (preorden, como el CSV) en listas por columna."""
+    columns: Dict[str, List[Any]] = {
+        name: [] for name in (*TEXT_COLUMNS, *FLOAT_COLUMNS, PARENT_COLUMN)
+    }
+    tipo, codigo = columns["tipo"], columns["codigo"]
+    corta, larga = columns["descripcion_corta"], columns["descripcion_larga"]
+    unidad, mediciones = columns["unidad"], columns["mediciones"]
+    precio, cantidad = columns["precio"], columns["cantidad_pres"]
+    importe, total = columns["importe_pres"], columns["importe_total"]
+    padre = columns[PARENT_COLUMN]
+
+    for node, parent_row in iter_preorder(roots):
+        tipo.append(node.kind)
+        codigo.append(node.code)
+        corta.append(node.description)
+        larga.append(node.long_desc or "")
+        unidad.append(node.unidad or "")
+        mediciones.append("⏎".join(node.measurements))
+        precio.append(node.precio)
+        cantidad.append(node.can_pres)
+        importe.append(node.imp_pres)
+        total.append(node.importe_total)
+        padre.append(parent_row)
+    return columns
+
+
+def _write_arrow(columns: Dict[str, List[Any]], path: Path) -> None:
+    import pyarrow as pa  # type: ignore
+
+    arrays = {name: pa.array(columns[name], type=pa.string()) for name in TEXT_COLUMNS}
+    arrays.update(
+        {name: pa.array(columns[name], type=pa.float64()) for name in FLOAT_COLUMNS}
+    )
+    arrays[PARENT_COLUMN] = pa.array(columns[PARENT_COLUMN], type=pa.int32())
+    table = pa.table(arrays)
+
+    if path.suffix.lower() == ".parquet":
+        import pyarrow.parquet as pq  # type: ignore
+
+        pq.write_table(table, path, compression="zstd")
+    else:
+        import pyarrow.feather as feather  # type: ignore
+
+        feather.write_feather(table, path, compression="zstd")
+
+
+def _write_npz(columns: Dict[str, List[Any]], path: Path) -> None:
+    import numpy as np
+
+    nan = float("nan")
+    arrays: Dict[str, Any] = {}
+    for name in FLOAT_COLUMNS:
+        arrays[name] = np.array(
+            [nan if value is None else value for value in columns[name]],
+            dtype=np.float64,
+        )
+    arrays[PARENT_COLUMN] = np.array(columns[PARENT_COLUMN], dtype=np.int32)
+
+    # Texto como UTF-8 concatenado + offsets: sin pickle y sin el relleno de
+    # los arrays de ancho fijo ("U"), que con las descripciones largas se
+    # comería toda la ganancia.
+    for name in TEXT_COLUMNS:
+        encoded = [value.encode("utf-8") for value in columns[name]]
+        arrays[name + _UTF8] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        arrays[name + _OFFSETS] = np.array(
+            [0, *accumulate(len(value) for value in encoded)],
+            dtype=np.int64,
+        )
+
+    with open(path, "wb") as fh:
+        np.savez_compressed(fh, **arrays)
+
+
+def export_columnar(roots: List[Node], path: Path) -> Path:
+    """
+    Exporta el árbol en formato columnar según la extensión de `path`:
+    `.parquet` / `.feather` / `.arrow` con pyarrow, `.npz` con NumPy. Sin
+    pyarrow instalado se escribe el `.npz` equivalente. Devuelve la ruta
+    realmente escrita.
+
+    Importes y cantidades van como float64 (NaN si faltan) y `fila_padre`
+    como int32, así que cargarlo no requiere parsear nada.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix not in _ARROW_SUFFIXES and suffix != _NPZ_SUFFIX:
+        raise ValueError(
+            f"Formato columnar no soportado: {path.name} "
+            "(usa .parquet, .feather, .arrow o .npz)."
+        )
+
+    columns = tree_columns(roots)
+    if suffix in _ARROW_SUFFIXES:
+        try:
+            _write_arrow(columns, path)
+            return path
+        except ImportError:
+            path = path.with_suffix(_NPZ_SUFFIX)
+
+    _write_npz(columns, path)
+    return path
+
+
+def load_npz_columns(path: Path) -> Dict[str, Any]:
+    """
+    Lee un `.npz` de `export_columnar`: columnas numéricas como arrays de
+    NumPy y columnas de texto como listas de `str`.
+    """
+    import numpy as np
+
+    with np.load(path, allow_pickle=False) as data:
+        columns: Dict[str, Any] = {name: data[name] for name in FLOAT_COLUMNS}
+        columns[PARENT_COLUMN] = data[PARENT_COLUMN]
+        for name in TEXT_COLUMNS:
+            raw = data[name + _UTF8].tobytes()
+            offsets = data[name + _OFFSETS].tolist()
+            columns[name] = [
+                raw[start:end].decode("utf-8")
+                for start, end in zip(offsets, offsets[1:])
+            ]
+    return columns
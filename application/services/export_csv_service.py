@@ -1,53 +1,68 @@
 # application/services/export_csv_service.py
 from __future__ import annotations
 
+import csv
+import os
 from pathlib import Path
-from typing import Any, Dict, List
-
-import pandas as pd
-
-from application.services.build_tree_service import Node
-
-
-def _flatten(node: Node, acc: List[Dict[str, Any]]) -> None:
-    acc.append(
-        {
-            "tipo": node.kind,
-            "codigo": node.code,
-            "descripcion_corta": node.description,
-            "descripcion_larga": node.long_desc or "",
-            "unidad": node.unidad or "",
-            "precio": node.precio if node.precio is not None else "",
-            "cantidad_pres": node.can_pres if node.can_pres is not None else "",
-            "importe_pres": node.imp_pres if node.imp_pres is not None else "",
-            "hijos": ",".join(child.code for child in node.children)
-            if node.children
-            else "",
-            "mediciones": "⏎".join(node.measurements),
-        }
-    )
-    for child in node.children:
-        _flatten(child, acc)
+from typing import Any, List
+
+from application.services.build_tree_service import Node, iter_preorder
+
+COLUMNS = (
+    "tipo",
+    "codigo",
+    "descripcion_corta",
+    "descripcion_larga",
+    "unidad",
+    "precio",
+    "cantidad_pres",
+    "importe_pres",
+    "importe_total",
+    "hijos",
+    "mediciones",
+)
+
+
+def _num(value: float | None) -> Any:
+    # `csv` escribe los float con repr, igual que pandas, y los int tal cual;
+    # None -> celda vacía.
+    return "" if value is None else value
+
+
+def _row(node: Node) -> List[Any]:
+    children = node.children
+    return [
+        node.kind,
+        node.code,
+        node.description,
+        node.long_desc or "",
+        node.unidad or "",
+        _num(node.precio),
+        _num(node.can_pres),
+        _num(node.imp_pres),
+        _num(node.importe_total),
+        ",".join(child.code for child in children) if children else "",
+        "⏎".join(node.measurements),
+    ]
 
 
 def export_to_csv(roots: List[Node], csv_path: Path, sep: str = ";") -> None:
-    rows: List[Dict[str, Any]] = []
-    for root in roots:
-        _flatten(root, rows)
-
-    df = pd.DataFrame(
-        rows,
-        columns=[
-            "tipo",
-            "codigo",
-            "descripcion_corta",
-            "descripcion_larga",
-            "unidad",
-            "precio",
-            "cantidad_pres",
-            "importe_pres",
-            "hijos",
-            "mediciones",
-        ],
-    )
-    df.to_csv(csv_path, sep=sep, index=False, encoding="utf-8")
+    """
+    Árbol aplanado en preorden, una fila por nodo, escrito en una sola
+    pasada según se recorre: la memoria no depende del tamaño del
+    presupuesto. Mismo formato que el `DataFrame.to_csv` anterior (comillas
+    mínimas, UTF-8 sin BOM, saltos de línea del sistema), salvo un caso: un
+    entero (la cantidad 1 de los descompuestos pasados a partida) sale "1";
+    pandas lo escribía "1.0" si su columna no tenía ninguna celda vacía, cosa
+    que no pasa en la práctica porque las raíces no tienen cantidad.
+    """
+    with open(csv_path, "w", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(
+            fh,
+            delimiter=sep,
+            quotechar='"',
+            quoting=csv.QUOTE_MINIMAL,
+            lineterminator=os.linesep,
+        )
+        writer.writerow(COLUMNS)
+        writer.writerows(_row(node) for node, _parent in iter_preorder(roots))
@@ -0,0 +1,46 @@
+# application/services/export_xlsx_service.py
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, List
+
+from application.services.build_tree_service import Node, iter_preorder
+from application.services.export_csv_service import COLUMNS
+from infrastructure.filesystem.xlsx_stream_writer import XlsxStreamWriter
+
+_WIDTHS = (14, 22, 50, 60, 8, 12, 12, 14, 14, 30, 40)
+
+
+def _row(node: Node) -> List[Any]:
+    children = node.children
+    return [
+        node.kind,
+        node.code,
+        node.description,
+        node.long_desc,
+        node.unidad,
+        node.precio,
+        node.can_pres,
+        node.imp_pres,
+        node.importe_total,
+        ",".join(child.code for child in children) if children else None,
+        "⏎".join(node.measurements),
+    ]
+
+
+def export_to_xlsx(roots: List[Node], xlsx_path: Path) -> None:
+    """
+    Mismas filas y columnas que `export_to_csv`, en un libro de Excel:
+    precio, cantidad e importes como celdas numéricas y cada fila agrupada
+    (esquema) según su profundidad en el árbol. Se escribe según se recorre,
+    así que la memoria no crece con el presupuesto.
+    """
+    with XlsxStreamWriter(xlsx_path, sheet_name="Árbol", widths=_WIDTHS) as xlsx:
+        xlsx.write_header(COLUMNS)
+        # Filas de la rama actual: la profundidad es su longitud.
+        path: List[int] = []
+        for row, (node, parent_row) in enumerate(iter_preorder(roots)):
+            while path and path[-1] != parent_row:
+                path.pop()
+            xlsx.write_row(_row(node), outline_level=len(path))
+            path.append(row)
@@ -0,0 +1,32 @@
+# application/services/phase1_service.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from application.services.build_tree_service import Node, build_tree
+from infrastructure.bc3.bc3_index import Bc3Index
+from infrastructure.bc3.bc3_modifier import convert_to_material
+
+
+@dataclass
+class Phase1Result:
+    index: Bc3Index
+    roots: List[Node]
+
+
+def run_phase1(
+    src: Path,
+    dst: Path,
+    *,
+    index: Optional[Bc3Index] = None,
+) -> Phase1Result:
+    """
+    Fase 1 completa (normalización a material + árbol + clones) escribiendo
+    `dst` una sola vez: la conversión se queda en memoria, el árbol se
+    construye sobre ese índice y `build_tree` escribe el resultado final.
+    """
+    converted = convert_to_material(src, dst, index=index, write=False)
+    roots = build_tree(converted)
+    return Phase1Result(index=converted, roots=roots)
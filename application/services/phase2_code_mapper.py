@@ -2,12 +2,12 @@
 from __future__ import annotations
 
 import csv
+import importlib.util
 import os
 import re
-from collections import defaultdict, deque
-from dataclasses import dataclass
+from collections import defaultdict
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Tuple
 
 from application.services.budget_bc3_batch_service import (
     BudgetBc3BatchRequest,
@@ -18,231 +18,128 @@ from domain.bc3.records import (
     DescomposicionRecord,
     MedicionesRecord,
 )
+from infrastructure.bc3.bc3_graph import Bc3Graph
+from infrastructure.bc3.bc3_index import Bc3Index
+from infrastructure.bc3.bc3_manifest import (
+    Phase2Manifest,
+    changed_concepts,
+    concept_hashes,
+    payload_hash,
+)
+from infrastructure.bc3.bc3_snapshot import load_bc3_index
+from infrastructure.bc3.bc3_writer import Bc3Writer
+from infrastructure.bc3.code_remapper import CodeRemapper
+from infrastructure.bc3.concept_store import ConceptView
 from infrastructure.clients.bc3_classifier_library_client import (
     Bc3ClassifierLibraryClient,
-)
-from infrastructure.filesystem.bc_refcru_package_writer import (
-    RefCruRow,
-    make_refcru_row,
-    write_refcru_config_package_xlsx,
+    resolve_model_name,
 )
 from utils.text_sanitize import clean_text
 
+if TYPE_CHECKING:
+    from infrastructure.filesystem.bc_refcru_package_writer import RefCruRow
+
 MAX_CODE_LEN = 20
+# Paquete de la librería del servicio 2: su catálogo interno va dentro.
+CLASSIFIER_PACKAGE = "ruesma_ocr_service"
+_CATALOG_SUFFIXES = {".yaml", ".yml", ".json", ".xlsx", ".csv"}
 NUM_RE = re.compile(r"^-?\d+(?:[.,]\d+)?$")
-_PIPE_TAIL_RE = re.compile(r"\|+\s*$")
-
-
-@dataclass
-class Concept:
-    code: str
-    unidad: str
-    desc_short: str
-    price_txt: str
-    tipo: str
-    long_desc: str | None = None
-
-
-def _final_trim_trailing_pipes(file_path: Path) -> None:
-    tmp = file_path.with_suffix(file_path.suffix + ".tmp_clean")
-    pat = re.compile(r"\|+\s*$")
-
-    with file_path.open("r", encoding="latin-1", errors="ignore") as fin, tmp.open(
-        "w",
-        encoding="latin-1",
-        errors="ignore",
-    ) as fout:
-        for raw in fin:
-            if raw.startswith("~"):
-                line = raw.rstrip("\n")
-                line = pat.sub("|", line)
-                fout.write(line + "\n")
-            else:
-                if not raw.endswith("\n"):
-                    raw += "\n"
-                fout.write(raw)
-
-    tmp.replace(file_path)
-
-
-def _fix_d_trailing_backslashes(file_path: Path) -> None:
-    tmp = file_path.with_suffix(file_path.suffix + ".tmp_dfix")
-
-    with file_path.open("r", encoding="latin-1", errors="ignore") as fin, tmp.open(
-        "w",
-        encoding="latin-1",
-        errors="ignore",
-    ) as fout:
-        for raw in fin:
-            if raw.startswith("~D|"):
-                line = raw.rstrip("\n")
-                if line.endswith("|"):
-                    core = line[:-1]
-                    core = core.rstrip("\\") + "\\"
-                    line = core + "|"
-                fout.write(line + "\n")
-            else:
-                if not raw.endswith("\n"):
-                    raw += "\n"
-                fout.write(raw)
-
-    tmp.replace(file_path)
-
-
-def _cleanup_trailing_pipes_file(path: Path) -> None:
-    tmp = path.with_suffix(path.suffix + ".tmp")
-    with path.open("r", encoding="latin-1", errors="ignore") as fin, tmp.open(
-        "w",
-        encoding="latin-1",
-        errors="ignore",
-    ) as fout:
-        for line in fin:
-            if line.rstrip("\n").endswith("|"):
-                clean = _PIPE_TAIL_RE.sub("|", line.rstrip("\n")) + "\n"
-                fout.write(clean)
-            else:
-                fout.write(line)
-    path.unlink()
-    tmp.rename(path)
+# Lo que `\s` considera espacio en un texto latin-1.
+_LATIN1_SPACES = b"\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0"
 
 
-def _collect_bc3_info(
-    path: Path,
-) -> Tuple[
-    Dict[str, Concept],
-    Dict[str, List[str]],
-    Dict[str, List[str]],
-]:
-    concepts: Dict[str, Concept] = {}
-    parents_of_set: Dict[str, set[str]] = {}
-    children_of: Dict[str, List[str]] = {}
-
-    with path.open("r", encoding="latin-1", errors="ignore") as fh:
-        for raw in fh:
-            if raw.startswith("~C|"):
-                _, rest = raw.split("|", 1)
-                parts = rest.rstrip("\n").split("|")
-                while len(parts) < 6:
-                    parts.append("")
-                code, unidad, desc, price, _date, tipo = parts[:6]
-                concepts[code] = Concept(
-                    code=code,
-                    unidad=unidad or "",
-                    desc_short=desc or "",
-                    price_txt=price or "",
-                    tipo=tipo or "",
-                )
+# Los conceptos son vistas sobre el `ConceptStore` del índice.
+Concept = ConceptView
 
-            elif raw.startswith("~T|"):
-                _, rest = raw.split("|", 1)
-                code, txt = rest.rstrip("\n").split("|", 1)
-                if code in concepts and concepts[code].long_desc is None:
-                    concepts[code].long_desc = txt
-
-            elif raw.startswith("~D|"):
-                _, rest = raw.split("|", 1)
-                parent, child_part = rest.split("|", 1)
-                chunks = child_part.rstrip("|\n").split("\\")
-
-                children: List[str] = []
-                for i in range(0, len(chunks), 3):
-                    child_code = (chunks[i] if i < len(chunks) else "").strip()
-                    if not child_code:
-                        continue
-                    parents_of_set.setdefault(child_code, set()).add(parent)
-                    children.append(child_code)
-
-                if children:
-                    children_of.setdefault(parent, [])
-                    children_of[parent].extend(children)
-
-    parents_of: Dict[str, List[str]] = {
-        child: sorted(list(parents))
-        for child, parents in parents_of_set.items()
-    }
-    return concepts, parents_of, children_of
+
+def _postclean_line(line: bytes) -> bytes:
+    """
+    Normalización de cola de una línea física del BC3 clasificado:
+    - "||||" final -> "|";
+    - en ~D, una sola "\\" antes del "|" final;
+    - en registros "~", "|" seguido de espacios al final -> "|".
+    """
+    if line.endswith(b"||"):
+        line = line.rstrip(b"|") + b"|"
+    if line.startswith(b"~D|") and line.endswith(b"|"):
+        line = line[:-1].rstrip(b"\\") + b"\\|"
+    if line.startswith(b"~"):
+        stripped = line.rstrip(_LATIN1_SPACES)
+        if stripped.endswith(b"|") and (len(stripped) != len(line) or stripped.endswith(b"||")):
+            line = stripped.rstrip(b"|") + b"|"
+    return line
+
+
+def _postclean_record(raw: bytes) -> bytes:
+    """`_postclean_line` sobre cada línea del registro; todas acaban en "\\n"."""
+    if not raw:
+        return raw
+    body = raw[:-1] if raw.endswith(b"\n") else raw
+    if b"\n" not in body:
+        return _postclean_line(body) + b"\n"
+    return b"".join(_postclean_line(line) + b"\n" for line in body.split(b"\n"))
+
+
+def _collect_bc3_info(
+    source: Path | Bc3Index,
+) -> Tuple[Mapping[str, Concept], Bc3Graph]:
+    index = source if isinstance(source, Bc3Index) else load_bc3_index(source)
+    return index.concepts, index.graph
 
 
 def _closest_partidas_for(
     code: str,
     *,
-    concepts: Dict[str, Concept],
-    parents_of: Dict[str, List[str]],
+    concepts: Mapping[str, Concept],
+    graph: Bc3Graph,
 ) -> set[str]:
-    direct = parents_of.get(code, []) or []
-    if not direct:
+    store = graph.store
+    cid = store.id_of(code)
+    if cid < 0 or not graph.has_parents(cid):
         return {"__ROOT__"}
 
-    partidas: set[str] = set()
-    queue = deque(direct)
-    seen: set[str] = set()
-
-    while queue:
-        current = queue.popleft()
-        if current in seen:
-            continue
-        seen.add(current)
-
-        current_concept = concepts.get(current)
-        if current_concept and (current_concept.tipo or "").strip() == "0":
-            partidas.add(current)
-            continue
-
-        for parent in parents_of.get(current, []) or []:
-            if parent not in seen:
-                queue.append(parent)
-
-    return partidas or {"__ROOT__"}
+    partidas = graph.closest_ancestors(
+        cid,
+        lambda current: store.is_concept(current)
+        and store.tipo_of(current).strip() == "0",
+    )
+    return {store.code_of(partida) for partida in partidas} or {"__ROOT__"}
 
 
 def _nearest_ancestor_desc(
     start_code: str,
     *,
-    concepts: Dict[str, Concept],
-    parents_of: Dict[str, List[str]],
+    concepts: Mapping[str, Concept],
+    graph: Bc3Graph,
     predicate,
 ) -> Optional[str]:
-    queue = deque([start_code])
-    seen: set[str] = set()
-
-    while queue:
-        current = queue.popleft()
-        for parent in parents_of.get(current, []) or []:
-            if parent in seen:
-                continue
-            seen.add(parent)
-            if predicate(parent):
-                concept = concepts.get(parent)
-                if concept:
-                    txt = clean_text(concept.desc_short or "") or clean_text(
-                        concept.long_desc or ""
-                    )
-                    return txt or None
-            queue.append(parent)
+    store = graph.store
+    cid = store.id_of(start_code)
+    if cid < 0:
+        return None
 
-    return None
+    found = graph.nearest_ancestor(
+        cid,
+        lambda current: store.is_concept(current) and predicate(store.code_of(current)),
+    )
+    if found < 0:
+        return None
+    concept = concepts[store.code_of(found)]
+    txt = clean_text(concept.desc_short or "") or clean_text(concept.long_desc or "")
+    return txt or None
 
 
 def _partida_desc_for(
-    old_code: str,
+    partidas: set[str],
     *,
-    concepts: Dict[str, Concept],
-    parents_of: Dict[str, List[str]],
+    concepts: Mapping[str, Concept],
 ) -> Optional[str]:
-    partidas = sorted(
-        list(
-            _closest_partidas_for(
-                old_code,
-                concepts=concepts,
-                parents_of=parents_of,
-            )
-        )
-    )
-    if not partidas or partidas == ["__ROOT__"]:
+    ordered = sorted(partidas)
+    if not ordered or ordered == ["__ROOT__"]:
         return None
 
     descriptions: List[str] = []
-    for partida_code in partidas[:5]:
+    for partida_code in ordered[:5]:
         concept = concepts.get(partida_code)
         if not concept:
             continue
@@ -255,33 +152,30 @@ def _partida_desc_for(
     return " | ".join(descriptions) if descriptions else None
 
 
+def _search_start(old_code: str, partidas: set[str]) -> str:
+    ordered = sorted(partidas)
+    return ordered[0] if ordered and ordered[0] != "__ROOT__" else old_code
+
+
 def _capitulo_desc_for(
     old_code: str,
+    partidas: set[str],
     *,
-    concepts: Dict[str, Concept],
-    parents_of: Dict[str, List[str]],
+    concepts: Mapping[str, Concept],
+    graph: Bc3Graph,
 ) -> Optional[str]:
-    partidas = sorted(
-        list(
-            _closest_partidas_for(
-                old_code,
-                concepts=concepts,
-                parents_of=parents_of,
-            )
-        )
-    )
-    start = partidas[0] if partidas and partidas[0] != "__ROOT__" else old_code
+    start = _search_start(old_code, partidas)
 
     cap = _nearest_ancestor_desc(
         start,
         concepts=concepts,
-        parents_of=parents_of,
+        graph=graph,
         predicate=lambda x: ("#" in x) and ("##" not in x) and (x != "CD#"),
     )
     sub = _nearest_ancestor_desc(
         start,
         concepts=concepts,
-        parents_of=parents_of,
+        graph=graph,
         predicate=lambda x: ("##" in x) and (x != "CD#"),
     )
     return cap or sub
@@ -289,25 +183,17 @@ def _capitulo_desc_for(
 
 def _subcapitulo_desc_for(
     old_code: str,
+    partidas: set[str],
     *,
-    concepts: Dict[str, Concept],
-    parents_of: Dict[str, List[str]],
+    concepts: Mapping[str, Concept],
+    graph: Bc3Graph,
 ) -> Optional[str]:
-    partidas = sorted(
-        list(
-            _closest_partidas_for(
-                old_code,
-                concepts=concepts,
-                parents_of=parents_of,
-            )
-        )
-    )
-    start = partidas[0] if partidas and partidas[0] != "__ROOT__" else old_code
+    start = _search_start(old_code, partidas)
 
     return _nearest_ancestor_desc(
         start,
         concepts=concepts,
-        parents_of=parents_of,
+        graph=graph,
         predicate=lambda x: ("##" in x) and (x != "CD#"),
     )
 
@@ -369,12 +255,114 @@ def _letters_suffix(n: int) -> str:
     return suffix
 
 
+def _prompt_key() -> str:
+    return (os.getenv("BC3_CLASSIFY_PROMPT_KEY") or "bc3_clasificador_es").strip()
+
+
+def _file_stamp(path: Path) -> str:
+    try:
+        stat = path.stat()
+    except OSError:
+        return f"{path}:?"
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _catalog_fingerprint(catalog_xlsx: Optional[Path]) -> str:
+    """
+    Tamaño y fecha de los ficheros de catálogo: los que trae la librería del
+    servicio 2 y, si se pasa, el Excel de catálogo; más la hoja configurada.
+    """
+    stamps = [f"sheet={(os.getenv('BC3_CATALOG_SHEET') or '').strip()}"]
+    if catalog_xlsx is not None:
+        stamps.append(_file_stamp(Path(catalog_xlsx).resolve()))
+    try:
+        spec = importlib.util.find_spec(CLASSIFIER_PACKAGE)
+    except (ImportError, ValueError):
+        spec = None
+    for location in (spec.submodule_search_locations or []) if spec else []:
+        root = Path(location)
+        stamps.extend(
+            _file_stamp(path)
+            for path in sorted(root.rglob("*"))
+            if path.suffix.lower() in _CATALOG_SUFFIXES and path.is_file()
+        )
+    return payload_hash({"catalog": stamps})
+
+
+def _run_context(project: str, catalog_xlsx: Optional[Path]) -> Dict[str, str]:
+    """
+    Lo que, si cambia, invalida las clasificaciones guardadas. El BC3 de
+    entrada no cuenta: se puede mover o renombrar, y sus cambios ya los ven
+    los hashes por concepto.
+    """
+    return {
+        "project": project,
+        "model": resolve_model_name(),
+        "prompt_key": _prompt_key(),
+        "catalog": _catalog_fingerprint(catalog_xlsx),
+    }
+
+
+def _reuse_previous_classifications(
+    batch_items: List[Dict[str, Any]],
+    *,
+    index: Bc3Index,
+    graph: Bc3Graph,
+    manifest: Phase2Manifest,
+    payload_digests: Dict[str, str],
+    base_choice: Dict[str, str],
+    conf_choice: Dict[str, float],
+    method_choice: Dict[str, str],
+    progress_cb: Optional[Any] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rellena las elecciones de los descompuestos que no han cambiado desde la
+    ejecución anterior y devuelve solo los que hay que volver a clasificar.
+    """
+    hashes = concept_hashes(index)
+    changed = changed_concepts(manifest.concepts, hashes, graph)
+    manifest.concepts = hashes
+
+    pending: List[Dict[str, Any]] = []
+    for item in batch_items:
+        old_code = item["id"]
+        digest = payload_hash(item)
+        payload_digests[old_code] = digest
+        entry = manifest.reusable(old_code, digest, changed)
+        if entry is None:
+            pending.append(item)
+            continue
+
+        base_choice[old_code] = str(entry.get("codigo") or "")
+        conf_choice[old_code] = float(entry.get("confidence") or 0.0)
+        method_choice[old_code] = str(entry.get("method") or "")
+        if progress_cb:
+            progress_cb(
+                {
+                    "old_code": old_code,
+                    "new_code": base_choice[old_code],
+                    "confidence": conf_choice[old_code],
+                }
+            )
+
+    if progress_cb and len(pending) < len(batch_items):
+        progress_cb(
+            f"Incremental: {len(batch_items) - len(pending)} descompuestos sin "
+            f"cambios reutilizados, {len(pending)} a clasificar."
+        )
+    return pending
+
+
 def _build_replacement_map(
     bc3_path: Path,
     *,
     progress_cb: Optional[Any] = None,
+    index: Optional[Bc3Index] = None,
+    manifest: Optional[Phase2Manifest] = None,
 ) -> Tuple[Dict[str, str], List[Tuple[str, str, float, str]]]:
-    concepts, parents_of, _children = _collect_bc3_info(bc3_path)
+    if index is None:
+        index = load_bc3_index(bc3_path)
+    concepts, graph = _collect_bc3_info(index)
 
     targets: List[str] = []
     for code, concept in concepts.items():
@@ -389,7 +377,7 @@ def _build_replacement_map(
         partidas_by_old[old_code] = _closest_partidas_for(
             old_code,
             concepts=concepts,
-            parents_of=parents_of,
+            graph=graph,
         )
 
     base_choice: Dict[str, str] = {}
@@ -429,30 +417,43 @@ def _build_replacement_map(
                 "descripcion": description or desc_short or old_code,
                 "capitulo": _capitulo_desc_for(
                     old_code,
+                    partidas_by_old[old_code],
                     concepts=concepts,
-                    parents_of=parents_of,
+                    graph=graph,
                 ),
                 "subcapitulo": _subcapitulo_desc_for(
                     old_code,
+                    partidas_by_old[old_code],
                     concepts=concepts,
-                    parents_of=parents_of,
+                    graph=graph,
                 ),
                 "partida": _partida_desc_for(
-                    old_code,
+                    partidas_by_old[old_code],
                     concepts=concepts,
-                    parents_of=parents_of,
                 ),
                 "unidad": (concept.unidad or "").strip() or None,
             }
         )
 
+    payload_digests: Dict[str, str] = {}
+    if manifest is not None:
+        batch_items = _reuse_previous_classifications(
+            batch_items,
+            index=index,
+            graph=graph,
+            manifest=manifest,
+            payload_digests=payload_digests,
+            base_choice=base_choice,
+            conf_choice=conf_choice,
+            method_choice=method_choice,
+            progress_cb=progress_cb,
+        )
+
     if batch_items:
         batch_service = BudgetBc3BatchService(
             bc3_client=Bc3ClassifierLibraryClient.from_env(),
         )
-        prompt_key = (
-            os.getenv("BC3_CLASSIFY_PROMPT_KEY") or "bc3_clasificador_es"
-        ).strip()
+        prompt_key = _prompt_key()
 
         def _on_batch_progress(
             batch_index: int,
@@ -504,6 +505,18 @@ def _build_replacement_map(
             progress_callback=_on_batch_progress,
         )
 
+    if manifest is not None:
+        manifest.classified = {
+            old_code: {
+                "payload": digest,
+                "codigo": base_choice[old_code],
+                "confidence": conf_choice.get(old_code, 0.0),
+                "method": method_choice.get(old_code, ""),
+            }
+            for old_code, digest in payload_digests.items()
+            if old_code in base_choice
+        }
+
     repl: Dict[str, str] = {}
     discount_counter = 0
     for old_code in targets:
@@ -579,47 +592,55 @@ def _build_replacement_map(
     return repl, rows
 
 
-def rewrite_bc3_with_codes(src: Path, dst: Path, repl_map: Dict[str, str]) -> None:
-    if not repl_map:
-        dst.write_text(
-            src.read_text("latin-1", errors="ignore"),
-            "latin-1",
-            errors="ignore",
+def _remap_record(index: Bc3Index, rec_no: int, repl_map: Dict[str, str]) -> str | None:
+    """Línea nueva del registro si algún código cambia; None si queda igual."""
+    tag = index.record_tag(rec_no)
+    rec: ConceptRecord | DescomposicionRecord | MedicionesRecord
+    try:
+        if tag == "~C":
+            if index.record_field(rec_no, 1) not in repl_map:
+                return None
+            rec = ConceptRecord.parse(index.record(rec_no))
+            rec.map_code(repl_map)
+        elif tag == "~D":
+            rec = DescomposicionRecord.parse(index.record(rec_no))
+            rec.map_child_codes(repl_map)
+        elif tag == "~M":
+            if index.record_field(rec_no, 1).partition("\\")[2] not in repl_map:
+                return None
+            rec = MedicionesRecord.parse(index.record(rec_no))
+            rec.map_child_codes(repl_map)
+        else:
+            return None
+        return rec.to_line() if rec.dirty else None
+    except Exception:
+        return None
+
+
+def rewrite_bc3_with_codes(
+    src: Path,
+    dst: Path,
+    repl_map: Dict[str, str],
+    *,
+    index: Optional[Bc3Index] = None,
+) -> None:
+    if index is None:
+        index = load_bc3_index(src)
+
+    remapper = CodeRemapper(repl_map)
+    out = Bc3Writer(postprocess=_postclean_record)
+    for rec_no in range(len(index)):
+        line = (
+            _remap_record(index, rec_no, repl_map)
+            if remapper.touches(index.raw_record(rec_no))
+            else None
         )
-        return
-
-    with src.open("r", encoding="latin-1", errors="ignore") as fin, dst.open(
-        "w",
-        encoding="latin-1",
-        errors="ignore",
-    ) as fout:
-        for raw in fin:
-            if raw.startswith("~C|"):
-                try:
-                    rec = ConceptRecord.parse(raw)
-                    rec.map_code(repl_map)
-                    fout.write(rec.to_line())
-                except Exception:
-                    fout.write(raw)
-
-            elif raw.startswith("~D|"):
-                try:
-                    rec = DescomposicionRecord.parse(raw)
-                    rec.map_child_codes(repl_map)
-                    fout.write(rec.to_line())
-                except Exception:
-                    fout.write(raw)
-
-            elif raw.startswith("~M|"):
-                try:
-                    rec = MedicionesRecord.parse(raw)
-                    rec.map_child_codes(repl_map)
-                    fout.write(rec.to_line())
-                except Exception:
-                    fout.write(raw)
-
-            else:
-                fout.write(raw)
+        if line is None:
+            out.copy(index.raw_record(rec_no))
+        else:
+            out.write(line)
+
+    out.write_to(dst, atomic=True)
 
 
 def _write_mapping_csv(
@@ -644,9 +665,15 @@ def run_phase2(
     Fase 2: clasifica descompuestos contra el catálogo interno YAML de la
     librería del servicio 2 y sustituye códigos.
 
-    `catalog_xlsx` se mantiene solo por compatibilidad retroactiva, pero ya no se usa.
+    `catalog_xlsx` se mantiene solo por compatibilidad retroactiva: no se
+    clasifica con él, solo cuenta para invalidar el manifiesto incremental.
+
+    En modo incremental (`incremental`, PHASE2_INCREMENTAL) se reutilizan las
+    clasificaciones del manifiesto de `bc3_out` (o `manifest_path`) si son del
+    mismo proyecto (`project_id`, por defecto el nombre de `bc3_out`), modelo,
+    prompt y catálogo. Solo se ahorra la clasificación: el BC3 y el CSV de
+    correspondencias se escriben enteros en cada ejecución.
     """
-    _ = catalog_xlsx
 
     if bc3_in is None:
         bc3_in = kwargs.pop("input_bc3", None)
@@ -694,26 +721,51 @@ def run_phase2(
             progress_cb = kwargs[key]
             break
 
+    index: Optional[Bc3Index] = kwargs.pop("index", None)
+    if index is None:
+        index = load_bc3_index(bc3_in)
+
+    incremental = kwargs.pop("incremental", None)
+    if incremental is None:
+        incremental = os.getenv("PHASE2_INCREMENTAL", "true").strip().lower() in {
+            "1",
+            "true",
+            "yes",
+            "y",
+            "si",
+            "sí",
+        }
+    manifest_path = kwargs.pop("manifest_path", None)
+    project_id = str(kwargs.pop("project_id", None) or bc3_out.stem)
+    manifest: Optional[Phase2Manifest] = None
+    if incremental:
+        manifest = (
+            Phase2Manifest.load(Path(manifest_path))
+            if manifest_path is not None
+            else Phase2Manifest.for_output(bc3_out)
+        )
+        had_state = bool(manifest.classified)
+        if not manifest.bind(_run_context(project_id, catalog_xlsx)) and had_state:
+            if progress_cb:
+                progress_cb(
+                    "Incremental: el manifiesto anterior es de otro proyecto, "
+                    "modelo, prompt o catálogo; se clasifica todo."
+                )
+
     repl_map, rows = _build_replacement_map(
         bc3_in,
         progress_cb=progress_cb,
+        index=index,
+        manifest=manifest,
     )
 
-    rewrite_bc3_with_codes(bc3_in, bc3_out, repl_map)
-    _cleanup_trailing_pipes_file(bc3_out)
-
-    try:
-        _fix_d_trailing_backslashes(bc3_out)
-    except Exception:
-        pass
+    rewrite_bc3_with_codes(bc3_in, bc3_out, repl_map, index=index)
 
     map_csv = bc3_out.with_name(bc3_out.stem + "_map.csv")
     _write_mapping_csv(rows, map_csv)
 
-    try:
-        _final_trim_trailing_pipes(bc3_out)
-    except Exception:
-        pass
+    if manifest is not None:
+        manifest.save()
 
     if emit_refcru_xlsx:
         if refcru_template_xlsx is None or not refcru_template_xlsx.exists():
@@ -722,6 +774,12 @@ def run_phase2(
                     "Aviso: no se encontró plantilla REFCRU. Selecciónala con 'Buscar...'"
                 )
         else:
+            # ElementTree (~20 ms) solo si se genera el REFCRU.
+            from infrastructure.filesystem.bc_refcru_package_writer import (
+                make_refcru_row,
+                write_refcru_config_package_xlsx,
+            )
+
             ref_rows: List[RefCruRow] = []
             for old_code, new_code, _conf, _method in rows:
                 ref_rows.append(
@@ -0,0 +1,196 @@
+# application/services/tree_diff_service.py
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from application.services.build_tree_service import build_lazy_tree, iter_postorder
+
+ADDED = "added"
+REMOVED = "removed"
+MODIFIED = "modified"
+
+_FIELDS = (
+    ("kind", "tipo"),
+    ("description", "descripcion_corta"),
+    ("long_desc", "descripcion_larga"),
+    ("unidad", "unidad"),
+    ("precio", "precio"),
+    ("can_pres", "cantidad_pres"),
+)
+_NONE = b"\x00"
+
+
+@dataclass(frozen=True)
+class NodeHashes:
+    # Contenido propio del concepto: campos, mediciones y códigos de los
+    # hijos (un ~D que cambia es un cambio del padre).
+    own: bytes
+    # `own` + hash de subárbol de cada hijo: si coincide, nada cambia debajo.
+    subtree: bytes
+
+
+def tree_hashes(roots: Iterable[Any]) -> Dict[str, NodeHashes]:
+    """
+    Hashes Merkle por código, de abajo arriba en una pasada. Sirve para
+    `Node` y `LazyNode`; si un código sale dos veces se queda el primero.
+    La arista que cierra un ciclo entra solo con el código del hijo.
+    """
+    return _hash_tree(roots)[0]
+
+
+def _hash_tree(roots: Iterable[Any]) -> Tuple[Dict[str, NodeHashes], Dict[str, Any]]:
+    hashes: Dict[str, NodeHashes] = {}
+    nodes: Dict[str, Any] = {}
+    by_id: Dict[int, bytes] = {}
+    blake2b = hashlib.blake2b
+    for node in iter_postorder(roots):
+        children = node.children
+        # `repr` de la tupla: cadenas sin ambigüedad y floats exactos. Mismo
+        # orden que `_FIELDS`.
+        content = (
+            node.kind,
+            node.description,
+            node.long_desc,
+            node.unidad,
+            node.precio,
+            node.can_pres,
+            tuple(node.measurements),
+            tuple([child.code for child in children]),
+        )
+        own = blake2b(repr(content).encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        subtree = blake2b(
+            own + b"".join([by_id.get(id(child), _NONE) for child in children]),
+            digest_size=16,
+        ).digest()
+        by_id[id(node)] = subtree
+        code = node.code
+        if code not in hashes:
+            hashes[code] = NodeHashes(own=own, subtree=subtree)
+            nodes[code] = node
+    return hashes, nodes
+
+
+def _delta(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if old is None or new is None:
+        return None
+    return new - old
+
+
+@dataclass
+class ConceptChange:
+    code: str
+    status: str
+    kind: str = ""
+    description: str = ""
+    old_precio: float | None = None
+    new_precio: float | None = None
+    old_cantidad: float | None = None
+    new_cantidad: float | None = None
+    old_importe: float | None = None
+    new_importe: float | None = None
+    # Campos (nombres del CSV) que difieren; `hijos`/`mediciones` incluidos.
+    fields: List[str] = field(default_factory=list)
+
+    @property
+    def precio_delta(self) -> float | None:
+        return _delta(self.old_precio, self.new_precio)
+
+    @property
+    def cantidad_delta(self) -> float | None:
+        return _delta(self.old_cantidad, self.new_cantidad)
+
+    @property
+    def importe_delta(self) -> float | None:
+        return _delta(self.old_importe, self.new_importe)
+
+
+@dataclass
+class TreeDiff:
+    added: List[ConceptChange] = field(default_factory=list)
+    removed: List[ConceptChange] = field(default_factory=list)
+    modified: List[ConceptChange] = field(default_factory=list)
+    # Subárboles descartados de golpe por tener el mismo hash.
+    skipped_subtrees: int = 0
+
+    @property
+    def changes(self) -> List[ConceptChange]:
+        return sorted(self.added + self.removed + self.modified, key=lambda c: c.code)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.modified)
+
+
+def _importe(node: Any) -> float | None:
+    total = node.importe_total
+    return total if total is not None else node.imp_pres
+
+
+def _change(code: str, status: str, old: Any, new: Any) -> ConceptChange:
+    current = new if new is not None else old
+    change = ConceptChange(code=code, status=status, kind=current.kind, description=current.description)
+    if old is not None:
+        change.old_precio = old.precio
+        change.old_cantidad = old.can_pres
+        change.old_importe = _importe(old)
+    if new is not None:
+        change.new_precio = new.precio
+        change.new_cantidad = new.can_pres
+        change.new_importe = _importe(new)
+    if old is not None and new is not None:
+        change.fields = [
+            name for attr, name in _FIELDS if getattr(old, attr) != getattr(new, attr)
+        ]
+        if [c.code for c in old.children] != [c.code for c in new.children]:
+            change.fields.append("hijos")
+        if list(old.measurements) != list(new.measurements):
+            change.fields.append("mediciones")
+    return change
+
+
+def diff_trees(old_roots: List[Any], new_roots: List[Any]) -> TreeDiff:
+    """
+    Conceptos añadidos, eliminados y modificados entre dos árboles de
+    `build_tree` (o `build_lazy_tree`), cada lista ordenada por código.
+
+    Se recorre el árbol nuevo desde las raíces; un concepto cuyo hash de
+    subárbol coincide con el del árbol viejo no se vuelve a bajar, así que
+    las ramas sin cambios cuestan una comparación.
+    """
+    old_hashes, old_nodes = _hash_tree(old_roots)
+    new_hashes, new_nodes = _hash_tree(new_roots)
+
+    diff = TreeDiff()
+    for code in sorted(new_nodes.keys() - old_nodes.keys()):
+        diff.added.append(_change(code, ADDED, None, new_nodes[code]))
+    for code in sorted(old_nodes.keys() - new_nodes.keys()):
+        diff.removed.append(_change(code, REMOVED, old_nodes[code], None))
+
+    seen: set[str] = set()
+    modified: List[str] = []
+    stack: List[Tuple[str, Any]] = [(node.code, node) for node in reversed(new_roots)]
+    while stack:
+        code, node = stack.pop()
+        if code in seen:
+            continue
+        seen.add(code)
+        previous = old_hashes.get(code)
+        current = new_hashes[code]
+        if previous is not None:
+            if previous.subtree == current.subtree:
+                diff.skipped_subtrees += 1
+                continue
+            if previous.own != current.own:
+                modified.append(code)
+        stack.extend((child.code, child) for child in reversed(node.children))
+
+    for code in sorted(modified):
+        diff.modified.append(_change(code, MODIFIED, old_nodes[code], new_nodes[code]))
+    return diff
+
+
+def diff_bc3(old_bc3: Path, new_bc3: Path) -> TreeDiff:
+    """`diff_trees` de dos BC3 leídos tal cual (sin clones ni reescritura)."""
+    return diff_trees(build_lazy_tree(Path(old_bc3)), build_lazy_tree(Path(new_bc3)))
@@ -0,0 +1,77 @@
+# application/services/tree_render_service.py
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from application.services.build_tree_service import iter_postorder
+
+
+def _line(node: Any, depth: int) -> str:
+    return (
+        f"{' ' * (4 * depth)}- [{node.kind.upper():12}] "
+        f"{node.code:<15} "
+        f"{(node.unidad or '').ljust(5)} "
+        f"{node.description}"
+    )
+
+
+def find_subtrees(roots: Iterable[Any], codes: Sequence[str]) -> List[Any]:
+    """Nodos con esos códigos (el primero de cada uno), en el orden pedido."""
+    wanted = set(codes)
+    found: Dict[str, Any] = {}
+    for node in iter_postorder(roots):
+        if node.code in wanted and node.code not in found:
+            found[node.code] = node
+            if len(found) == len(wanted):
+                break
+    return [found[code] for code in codes if code in found]
+
+
+def render_tree(
+    roots: Iterable[Any],
+    *,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    subtrees: Sequence[str] = (),
+) -> List[str]:
+    """
+    Líneas del árbol en preorden, hijos por código. `max_depth` corta por
+    niveles (0 = solo las raíces), `max_nodes` por número de líneas y
+    `subtrees` sustituye las raíces por los nodos con esos códigos.
+
+    Los hijos de cada nodo se ordenan una sola vez aunque el nodo cuelgue de
+    varios padres; un nodo que ya está en la rama actual (ciclo) no se vuelve
+    a bajar.
+    """
+    if subtrees:
+        roots = find_subtrees(roots, subtrees)
+
+    lines: List[str] = []
+    sorted_children: Dict[int, List[Any]] = {}
+    for root in roots:
+        on_path: set[int] = set()
+        stack: List[Tuple[Any, int, bool]] = [(root, 0, False)]
+        while stack:
+            node, depth, leaving = stack.pop()
+            if leaving:
+                on_path.discard(id(node))
+                continue
+            if id(node) in on_path:
+                continue
+            if max_nodes is not None and len(lines) >= max_nodes:
+                lines.append(f"... (límite de {max_nodes} nodos)")
+                return lines
+            lines.append(_line(node, depth))
+            if max_depth is not None and depth >= max_depth:
+                continue
+
+            children = sorted_children.get(id(node))
+            if children is None:
+                # Invertido para la pila: sale primero el menor código.
+                children = sorted(node.children, key=lambda n: n.code)
+                children.reverse()
+                sorted_children[id(node)] = children
+            on_path.add(id(node))
+            stack.append((node, depth, True))
+            stack.extend((child, depth + 1, False) for child in children)
+    return lines
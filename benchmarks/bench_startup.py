@@ -0,0 +1,135 @@
+# benchmarks/bench_startup.py
+"""
+Tiempo de arranque (importación) de los puntos de entrada: CLI, GUI y fase 2.
+
+    python -m benchmarks.bench_startup [modulo ...] [--repeat N] [--top N] [--budget-ms MS]
+
+Cada importación va en un intérprete nuevo con `-X importtime`; se queda la
+mejor de N. Falla si al arrancar se carga una dependencia pesada (pandas,
+openpyxl, SDK de IA...): deben importarse al usar la función que las necesita.
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_MODULES = (
+    "interface_adapters.controllers.etl_controller",
+    "interface_adapters.gui.gui_app",
+    "application.services.phase2_code_mapper",
+)
+HEAVY_MODULES = (
+    "pandas",
+    "openpyxl",
+    "numpy",
+    "pyarrow",
+    "google.generativeai",
+    "ruesma_ocr_service",
+)
+
+PROJECT_PACKAGES = {
+    "application",
+    "config",
+    "domain",
+    "infrastructure",
+    "interface_adapters",
+    "utils",
+}
+
+# (módulo, propio µs, acumulado µs)
+Timing = Tuple[str, int, int]
+
+
+def _import_times(module: str) -> List[Timing]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["?"]
+        raise SystemExit(f"ERROR: no se pudo importar {module}: {tail[0]}")
+
+    timings: List[Timing] = []
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        timings.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return timings
+
+
+def _best_run(module: str, repeat: int) -> List[Timing]:
+    best: List[Timing] = []
+    best_total = None
+    for _ in range(repeat):
+        timings = _import_times(module)
+        total = sum(own for _name, own, _cum in timings)
+        if best_total is None or total < best_total:
+            best, best_total = timings, total
+    return best
+
+
+def _heavy(timings: List[Timing]) -> List[str]:
+    loaded = {name for name, _own, _cum in timings}
+    return [
+        name
+        for name in HEAVY_MODULES
+        if name in loaded or any(m.startswith(name + ".") for m in loaded)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=0.0,
+        help="falla si algún módulo tarda más en importar (0 = sin límite)",
+    )
+    args = parser.parse_args()
+
+    failures: List[str] = []
+    for module in args.modules:
+        timings = _best_run(module, max(1, args.repeat))
+        total_ms = sum(own for _name, own, _cum in timings) / 1000
+        print(f"{module}: {total_ms:.1f} ms, {len(timings)} módulos")
+
+        project: Dict[str, int] = {
+            name: cum
+            for name, _own, cum in timings
+            if name.split(".")[0] in PROJECT_PACKAGES
+        }
+        print("  propio:")
+        for name, own, _cum in sorted(timings, key=lambda t: -t[1])[: args.top]:
+            print(f"    {own / 1000:8.1f} ms  {name}")
+        print("  acumulado (proyecto):")
+        for name, cum in sorted(project.items(), key=lambda t: -t[1])[: args.top]:
+            print(f"    {cum / 1000:8.1f} ms  {name}")
+
+        heavy = _heavy(timings)
+        if heavy:
+            failures.append(f"{module} importa al arrancar: {', '.join(heavy)}")
+        if args.budget_ms and total_ms > args.budget_ms:
+            failures.append(f"{module}: {total_ms:.1f} ms > {args.budget_ms:g} ms")
+
+    for failure in failures:
+        print(f"ERROR: {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
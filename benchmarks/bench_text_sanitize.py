@@ -0,0 +1,84 @@
+# benchmarks/bench_text_sanitize.py
+"""
+Micro-benchmark de `clean_text` sobre las descripciones de un BC3 real
+(resumen de cada ~C y textos ~T).
+
+    python -m benchmarks.bench_text_sanitize [presupuesto.bc3] [--repeat N]
+
+Sin fichero se usa el de entrada configurado (INPUT_DIR / INPUT_FILE_NAME).
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Callable, List
+
+from config.settings import Settings
+from infrastructure.bc3.bc3_index import Bc3Index
+from utils.memo import clear_memos
+from utils.text_sanitize import _clean_text, clean_text_many
+
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_MULTI_SPACE_RE = re.compile(r"[ \t]+")
+
+
+def _reference_clean_text(text: str) -> str:
+    """Implementación original: NFKC y dos regex sobre cada cadena."""
+    text = unicodedata.normalize("NFKC", text)
+    text = text.replace("\ufeff", "")
+    text = _CONTROL_RE.sub("", text)
+    text = _MULTI_SPACE_RE.sub(" ", text)
+    return text.strip()
+
+
+def _descriptions(path: Path) -> List[str]:
+    index = Bc3Index.from_path(path)
+    try:
+        values = [concept.desc_short for concept in index.iter_concepts()]
+        values.extend(text for _code, text in index.iter_texts())
+        return values
+    finally:
+        index.close()
+
+
+def _best_of(repeat: int, func: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        clear_memos()
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("bc3", nargs="?", type=Path)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    settings = Settings()
+    path = args.bc3 or settings.input_dir / settings.input_filename
+    values = _descriptions(path)
+    ascii_count = sum(value.isascii() for value in values)
+    print(f"{path}: {len(values)} descripciones ({ascii_count} solo ASCII)")
+
+    expected = [_reference_clean_text(value) for value in values]
+    if clean_text_many(values) != expected:
+        raise SystemExit("ERROR: clean_text_many no coincide con la implementación original")
+
+    timings = {
+        "original": _best_of(args.repeat, lambda: [_reference_clean_text(v) for v in values]),
+        "ruta rápida": _best_of(args.repeat, lambda: [_clean_text(v) for v in values]),
+        "clean_text_many": _best_of(args.repeat, lambda: clean_text_many(values)),
+    }
+    base = timings["original"]
+    for name, elapsed in timings.items():
+        print(f"  {name:<16} {elapsed * 1000:9.1f} ms  x{base / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
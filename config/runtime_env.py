@@ -40,3 +40,17 @@ def load_runtime_dotenv() -> str | None:
             return str(candidate)
 
     return None
+
+
+def freeze_support() -> None:
+    """
+    Llamar al principio del bloque `__main__`: en el ejecutable congelado
+    (PyInstaller) los procesos hijos del parseo en paralelo (BC3_JOBS > 1)
+    arrancan el propio ejecutable, y esto los desvía al trabajo en lugar de
+    volver a lanzar la aplicación. Fuera del ejecutable no hace nada y no
+    importa multiprocessing.
+    """
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+
+        multiprocessing.freeze_support()
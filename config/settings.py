@@ -2,66 +2,100 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Callable
 
-try:
-    from dotenv import load_dotenv  # type: ignore
 
-    load_dotenv()
-except Exception:
-    pass
+@lru_cache(maxsize=None)
+def _load_dotenv() -> None:
+    # Al crear el primer `Settings`, no al importar el módulo: quien solo
+    # importa (la GUI al arrancar) no paga python-dotenv ni la búsqueda del
+    # fichero.
+    try:
+        from dotenv import load_dotenv  # type: ignore
+
+        load_dotenv()
+    except Exception:
+        pass
+
+
+def _getenv(name: str, default: str) -> str:
+    _load_dotenv()
+    return os.getenv(name, default)
 
 
 def _env_bool(name: str, default: str = "false") -> bool:
-    value = os.getenv(name, default)
+    value = _getenv(name, default)
     return str(value).strip().lower() in {"1", "true", "yes", "y", "si", "sí"}
 
 
 def _env_int(name: str, default: str) -> int:
-    raw = (os.getenv(name, default) or default).strip()
+    raw = (_getenv(name, default) or default).strip()
     try:
         return int(raw)
     except Exception:
         return int(default)
 
 
+def _env_str(name: str, default: str = "") -> str:
+    return (_getenv(name, default) or default).strip()
+
+
+def _env(factory: Callable[[], Any]) -> Any:
+    """Campo que se lee del entorno al crear cada `Settings`."""
+    return field(default_factory=factory)
+
+
 @dataclass(frozen=True)
 class Settings:
-    input_dir: Path = Path(os.getenv("INPUT_DIR", "input"))
-    output_dir: Path = Path(os.getenv("OUTPUT_DIR", "output"))
-    input_filename: str = os.getenv("INPUT_FILE_NAME", "presupuesto.bc3")
-    csv_filename: str = os.getenv("CSV_FILENAME", "presupuesto_tree.csv")
-    encoding: str = os.getenv("BC3_ENCODING", "latin-1")
-
-    max_code_len: int = _env_int("MAX_CODE_LEN", "20")
-    force_material: bool = _env_bool("FORCE_MATERIAL", "true")
-    fill_unit_ud: bool = _env_bool("FILL_UNIT_UD", "true")
-    create_clones: bool = _env_bool("CREATE_CLONES", "true")
-    rewrite_bc3: bool = _env_bool("REWRITE_BC3", "true")
-
-    csv_sep: str = os.getenv("CSV_SEPARATOR", ";")
-    log_level: str = os.getenv("LOG_LEVEL", "INFO")
-
-    phase2_dump_ocr_io: bool = _env_bool("PHASE2_DUMP_OCR_IO", "false")
-    phase2_dump_ocr_dir: str = (os.getenv("PHASE2_DUMP_OCR_DIR", "") or "").strip()
-    phase2_dump_ocr_mode: str = (
-        os.getenv("PHASE2_DUMP_OCR_MODE", "all") or "all"
-    ).strip().lower()
+    input_dir: Path = _env(lambda: Path(_getenv("INPUT_DIR", "input")))
+    output_dir: Path = _env(lambda: Path(_getenv("OUTPUT_DIR", "output")))
+    input_filename: str = _env(lambda: _getenv("INPUT_FILE_NAME", "presupuesto.bc3"))
+    csv_filename: str = _env(lambda: _getenv("CSV_FILENAME", "presupuesto_tree.csv"))
+    # Export a Excel adicional (.xlsx); vacío = no.
+    xlsx_filename: str = _env(lambda: _env_str("XLSX_FILENAME"))
+    # Export columnar adicional (.parquet/.feather/.arrow o .npz); vacío = no.
+    columnar_filename: str = _env(lambda: _env_str("COLUMNAR_FILENAME"))
+    encoding: str = _env(lambda: _getenv("BC3_ENCODING", "latin-1"))
+
+    max_code_len: int = _env(lambda: _env_int("MAX_CODE_LEN", "20"))
+    force_material: bool = _env(lambda: _env_bool("FORCE_MATERIAL", "true"))
+    fill_unit_ud: bool = _env(lambda: _env_bool("FILL_UNIT_UD", "true"))
+    create_clones: bool = _env(lambda: _env_bool("CREATE_CLONES", "true"))
+    rewrite_bc3: bool = _env(lambda: _env_bool("REWRITE_BC3", "true"))
+
+    # Procesos para parsear BC3 grandes (1 = en serie, 0 = uno por CPU).
+    bc3_jobs: int = _env(lambda: _env_int("BC3_JOBS", "1"))
+    bc3_cache_enabled: bool = _env(lambda: _env_bool("BC3_CACHE_ENABLED", "true"))
+    bc3_cache_dir: str = _env(lambda: _env_str("BC3_CACHE_DIR"))
+    bc3_cache_max_mb: int = _env(lambda: _env_int("BC3_CACHE_MAX_MB", "256"))
+
+    csv_sep: str = _env(lambda: _getenv("CSV_SEPARATOR", ";"))
+    # Niveles del árbol que se imprimen por consola (0 = todos).
+    tree_max_depth: int = _env(lambda: _env_int("TREE_MAX_DEPTH", "0"))
+    tree_max_nodes: int = _env(lambda: _env_int("TREE_MAX_NODES", "0"))
+    # Códigos separados por comas: solo se imprimen esos subárboles.
+    tree_subtrees: str = _env(lambda: _env_str("TREE_SUBTREES"))
+    log_level: str = _env(lambda: _getenv("LOG_LEVEL", "INFO"))
+
+    phase2_dump_ocr_io: bool = _env(lambda: _env_bool("PHASE2_DUMP_OCR_IO", "false"))
+    phase2_dump_ocr_dir: str = _env(lambda: _env_str("PHASE2_DUMP_OCR_DIR"))
+    phase2_dump_ocr_mode: str = _env(lambda: _env_str("PHASE2_DUMP_OCR_MODE", "all").lower())
 
     # Variables legacy mantenidas por compatibilidad. Ya no se usan en la llamada principal.
-    ocr_service_root: str = (os.getenv("OCR_SERVICE_ROOT", "") or "").strip()
-    ocr_service_python: str = (os.getenv("OCR_SERVICE_PYTHON", "") or "").strip()
-    ocr_service_module: str = (
-        os.getenv(
-            "OCR_SERVICE_MODULE",
-            "interface_adapters.cli.bc3_classify_stdin",
-        )
-        or ""
-    ).strip()
-    ocr_service_timeout_s: int = _env_int("OCR_SERVICE_TIMEOUT_S", "240")
-
-    bc3_classify_prompt_key: str = (
-        os.getenv("BC3_CLASSIFY_PROMPT_KEY", "bc3_clasificador_es") or ""
-    ).strip()
-    bc3_catalog_sheet: str = (os.getenv("BC3_CATALOG_SHEET", "") or "").strip()
+    ocr_service_root: str = _env(lambda: _env_str("OCR_SERVICE_ROOT"))
+    ocr_service_python: str = _env(lambda: _env_str("OCR_SERVICE_PYTHON"))
+    ocr_service_module: str = _env(
+        lambda: (
+            _getenv("OCR_SERVICE_MODULE", "interface_adapters.cli.bc3_classify_stdin")
+            or ""
+        ).strip()
+    )
+    ocr_service_timeout_s: int = _env(lambda: _env_int("OCR_SERVICE_TIMEOUT_S", "240"))
+
+    bc3_classify_prompt_key: str = _env(
+        lambda: (_getenv("BC3_CLASSIFY_PROMPT_KEY", "bc3_clasificador_es") or "").strip()
+    )
+    bc3_catalog_sheet: str = _env(lambda: _env_str("BC3_CATALOG_SHEET"))
@@ -2,51 +2,124 @@
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import Dict, List, Optional
 
 _TAIL_BACKSLASHES_RE = re.compile(r"(\\+)\|\s*$")
 
 
-@dataclass
 class BC3RecordBase:
-    tag: str
+    """
+    Registro BC3 que conserva la línea original y solo la trocea cuando se
+    accede a un campo. Mientras no se modifique nada, `to_line()` devuelve la
+    línea original sin tocar.
+
+    Los setters marcan el registro como modificado; si se muta en sitio una
+    lista devuelta por una propiedad hay que llamar a `mark_dirty()`.
+    """
+
+    __slots__ = ("tag", "_raw", "_dirty", "_parsed")
+
+    def __init__(self, tag: str, raw: Optional[str] = None) -> None:
+        self.tag = tag
+        self._raw = raw
+        self._dirty = raw is None
+        self._parsed = raw is None
 
     @classmethod
     def parse(cls, line: str) -> "BC3RecordBase":
         raise NotImplementedError
 
+    @property
+    def raw(self) -> Optional[str]:
+        return self._raw
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def mark_dirty(self) -> None:
+        self._ensure_parsed()
+        self._dirty = True
+
     def to_line(self) -> str:
+        if not self._dirty and self._raw is not None:
+            return self._raw
+        self._ensure_parsed()
+        return self._render()
+
+    def _ensure_parsed(self) -> None:
+        if not self._parsed:
+            assert self._raw is not None
+            self._split(self._raw)
+            self._parsed = True
+
+    def _split(self, line: str) -> None:
+        raise NotImplementedError
+
+    def _render(self) -> str:
         raise NotImplementedError
 
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_line()!r})"
+
 
-@dataclass
 class ConceptRecord(BC3RecordBase):
-    fields: List[str] = field(default_factory=list)
+    __slots__ = ("_fields",)
+
+    def __init__(
+        self,
+        tag: str = "~C",
+        fields: Optional[List[str]] = None,
+        *,
+        raw: Optional[str] = None,
+    ) -> None:
+        super().__init__(tag, raw)
+        self._fields: List[str] = list(fields) if fields is not None else []
+
+    @property
+    def fields(self) -> List[str]:
+        self._ensure_parsed()
+        return self._fields
+
+    @fields.setter
+    def fields(self, value: List[str]) -> None:
+        self._ensure_parsed()
+        self._fields = list(value)
+        self._dirty = True
 
     @property
     def code(self) -> str:
-        return self.fields[0] if self.fields else ""
+        fields = self.fields
+        return fields[0] if fields else ""
 
     @code.setter
     def code(self, value: str) -> None:
-        if not self.fields:
-            self.fields = [value]
+        fields = self.fields
+        if not fields:
+            fields.append(value)
+        elif fields[0] == value:
+            return
         else:
-            self.fields[0] = value
+            fields[0] = value
+        self._dirty = True
 
     @classmethod
     def parse(cls, line: str) -> "ConceptRecord":
         if not line.startswith("~C|"):
             raise ValueError("ConceptRecord.parse: línea no empieza por '~C|'")
+        return cls(tag="~C", raw=line)
+
+    def _split(self, line: str) -> None:
         head, rest = line.split("|", 1)
         parts = rest.rstrip("\n").split("|")
         while len(parts) < 6:
             parts.append("")
-        return cls(tag=head, fields=parts)
+        self.tag = head
+        self._fields = parts
 
-    def to_line(self) -> str:
-        return f"{self.tag}|{'|'.join(self.fields)}|\n"
+    def _render(self) -> str:
+        return f"{self.tag}|{'|'.join(self._fields)}|\n"
 
     def map_code(self, repl_map: Dict[str, str]) -> None:
         current = self.code
@@ -56,22 +129,74 @@ class ConceptRecord(BC3RecordBase):
 
 @dataclass
 class DescompLineaSimple:
+    __slots__ = ("child_code", "coef", "qty")
+
     child_code: str
     coef: str
     qty: str
 
 
-@dataclass
 class DescomposicionRecord(BC3RecordBase):
-    parent: str
-    triplets: List[DescompLineaSimple] = field(default_factory=list)
-    tail_backslashes: str = "\\"
+    __slots__ = ("_parent", "_triplets", "_tail_backslashes")
+
+    def __init__(
+        self,
+        tag: str = "~D",
+        parent: str = "",
+        triplets: Optional[List[DescompLineaSimple]] = None,
+        tail_backslashes: str = "\\",
+        *,
+        raw: Optional[str] = None,
+    ) -> None:
+        super().__init__(tag, raw)
+        self._parent = parent
+        self._triplets: List[DescompLineaSimple] = (
+            list(triplets) if triplets is not None else []
+        )
+        self._tail_backslashes = tail_backslashes
+
+    @property
+    def parent(self) -> str:
+        self._ensure_parsed()
+        return self._parent
+
+    @parent.setter
+    def parent(self, value: str) -> None:
+        self._ensure_parsed()
+        if value != self._parent:
+            self._parent = value
+            self._dirty = True
+
+    @property
+    def triplets(self) -> List[DescompLineaSimple]:
+        self._ensure_parsed()
+        return self._triplets
+
+    @triplets.setter
+    def triplets(self, value: List[DescompLineaSimple]) -> None:
+        self._ensure_parsed()
+        self._triplets = list(value)
+        self._dirty = True
+
+    @property
+    def tail_backslashes(self) -> str:
+        self._ensure_parsed()
+        return self._tail_backslashes
+
+    @tail_backslashes.setter
+    def tail_backslashes(self, value: str) -> None:
+        self._ensure_parsed()
+        if value != self._tail_backslashes:
+            self._tail_backslashes = value
+            self._dirty = True
 
     @classmethod
     def parse(cls, line: str) -> "DescomposicionRecord":
         if not line.startswith("~D|"):
             raise ValueError("DescomposicionRecord.parse: línea no empieza por '~D|'")
+        return cls(tag="~D", raw=line)
 
+    def _split(self, line: str) -> None:
         stripped = line.rstrip("\n")
         match = _TAIL_BACKSLASHES_RE.search(stripped)
         tail_bslashes = match.group(1) if match else "\\"
@@ -102,42 +227,99 @@ class DescomposicionRecord(BC3RecordBase):
                 )
             )
 
-        return cls(
-            tag=head,
-            parent=parent,
-            triplets=triplets,
-            tail_backslashes=tail_bslashes,
-        )
+        self.tag = head
+        self._parent = parent
+        self._triplets = triplets
+        self._tail_backslashes = tail_bslashes
 
-    def to_line(self) -> str:
+    def _render(self) -> str:
         new_chunks: List[str] = []
-        for triplet in self.triplets:
+        for triplet in self._triplets:
             if not triplet.child_code:
                 continue
             new_chunks.extend(
                 [triplet.child_code, triplet.coef, triplet.qty]
             )
 
-        body = "\\".join(new_chunks) + self.tail_backslashes
-        return f"{self.tag}|{self.parent}|{body}|\n"
+        body = "\\".join(new_chunks) + self._tail_backslashes
+        return f"{self.tag}|{self._parent}|{body}|\n"
 
     def map_child_codes(self, repl_map: Dict[str, str]) -> None:
         for triplet in self.triplets:
             if triplet.child_code in repl_map:
-                triplet.child_code = repl_map[triplet.child_code]
+                new_code = repl_map[triplet.child_code]
+                if new_code != triplet.child_code:
+                    triplet.child_code = new_code
+                    self._dirty = True
 
 
-@dataclass
 class MedicionesRecord(BC3RecordBase):
-    raw_pair: str
-    parent: Optional[str]
-    child: Optional[str]
-    tail: str
+    __slots__ = ("_raw_pair", "_parent", "_child", "_tail")
+
+    def __init__(
+        self,
+        tag: str = "~M",
+        raw_pair: str = "",
+        parent: Optional[str] = None,
+        child: Optional[str] = None,
+        tail: str = "",
+        *,
+        raw: Optional[str] = None,
+    ) -> None:
+        super().__init__(tag, raw)
+        self._raw_pair = raw_pair
+        self._parent = parent
+        self._child = child
+        self._tail = tail
+
+    @property
+    def raw_pair(self) -> str:
+        self._ensure_parsed()
+        return self._raw_pair
+
+    @property
+    def parent(self) -> Optional[str]:
+        self._ensure_parsed()
+        return self._parent
+
+    @parent.setter
+    def parent(self, value: Optional[str]) -> None:
+        self._ensure_parsed()
+        if value != self._parent:
+            self._parent = value
+            self._dirty = True
+
+    @property
+    def child(self) -> Optional[str]:
+        self._ensure_parsed()
+        return self._child
+
+    @child.setter
+    def child(self, value: Optional[str]) -> None:
+        self._ensure_parsed()
+        if value != self._child:
+            self._child = value
+            self._dirty = True
+
+    @property
+    def tail(self) -> str:
+        self._ensure_parsed()
+        return self._tail
+
+    @tail.setter
+    def tail(self, value: str) -> None:
+        self._ensure_parsed()
+        if value != self._tail:
+            self._tail = value
+            self._dirty = True
 
     @classmethod
     def parse(cls, line: str) -> "MedicionesRecord":
         if not line.startswith("~M|"):
             raise ValueError("MedicionesRecord.parse: línea no empieza por '~M|'")
+        return cls(tag="~M", raw=line)
+
+    def _split(self, line: str) -> None:
         _tag, after = line.split("|", 1)
         pair, tail = after.split("|", 1)
 
@@ -146,41 +328,78 @@ class MedicionesRecord(BC3RecordBase):
         if "\\" in pair:
             parent, child = pair.split("\\", 1)
 
-        return cls(
-            tag="~M",
-            raw_pair=pair,
-            parent=parent,
-            child=child,
-            tail=tail,
-        )
+        self._raw_pair = pair
+        self._parent = parent
+        self._child = child
+        self._tail = tail
 
-    def to_line(self) -> str:
-        if self.parent is not None and self.child is not None:
-            pair = f"{self.parent}\\{self.child}"
+    def _render(self) -> str:
+        if self._parent is not None and self._child is not None:
+            pair = f"{self._parent}\\{self._child}"
         else:
-            pair = self.raw_pair
-        return f"{self.tag}|{pair}|{self.tail}"
+            pair = self._raw_pair
+        return f"{self.tag}|{pair}|{self._tail}"
 
     def map_child_codes(self, repl_map: Dict[str, str]) -> None:
-        if self.child and self.child in repl_map:
-            self.child = repl_map[self.child]
+        child = self.child
+        if child and child in repl_map:
+            self.child = repl_map[child]
 
 
-@dataclass
 class TextoRecord(BC3RecordBase):
-    code: str
-    text: str
+    __slots__ = ("_code", "_text")
+
+    def __init__(
+        self,
+        tag: str = "~T",
+        code: str = "",
+        text: str = "",
+        *,
+        raw: Optional[str] = None,
+    ) -> None:
+        super().__init__(tag, raw)
+        self._code = code
+        self._text = text
+
+    @property
+    def code(self) -> str:
+        self._ensure_parsed()
+        return self._code
+
+    @code.setter
+    def code(self, value: str) -> None:
+        self._ensure_parsed()
+        if value != self._code:
+            self._code = value
+            self._dirty = True
+
+    @property
+    def text(self) -> str:
+        self._ensure_parsed()
+        return self._text
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self._ensure_parsed()
+        if value != self._text:
+            self._text = value
+            self._dirty = True
 
     @classmethod
     def parse(cls, line: str) -> "TextoRecord":
         if not line.startswith("~T|"):
             raise ValueError("TextoRecord.parse: línea no empieza por '~T|'")
+        return cls(tag="~T", raw=line)
+
+    def _split(self, line: str) -> None:
         stripped = line.rstrip("\n")
         head, rest = stripped.split("|", 1)
         code, txt = rest.split("|", 1)
         if txt.endswith("|"):
             txt = txt[:-1]
-        return cls(tag=head, code=code, text=txt)
+        self.tag = head
+        self._code = code
+        self._text = txt
 
-    def to_line(self) -> str:
-        return f"{self.tag}|{self.code}|{self.text}|\n"
+    def _render(self) -> str:
+        return f"{self.tag}|{self._code}|{self._text}|\n"
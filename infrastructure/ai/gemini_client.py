@@ -11,13 +11,19 @@ import json
 import os
 import random
 import time
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 
-# SDK oficial (si no está instalado, lanzamos en ejecución)
-try:
-    import google.generativeai as genai  # type: ignore
-except Exception as _e:  # pragma: no cover
-    genai = None
+
+# SDK oficial: se importa en la primera llamada (tarda en cargar); si no está
+# instalado, lanzamos en ejecución.
+@lru_cache(maxsize=None)
+def _sdk() -> Any:
+    try:
+        import google.generativeai as genai  # type: ignore
+    except Exception:  # pragma: no cover
+        return None
+    return genai
 
 
 # ----------------------------- Rate Limiter ---------------------------------
@@ -41,6 +47,7 @@ class RateLimiter:
 def _configure() -> tuple[Optional[str], str]:
     api_key = os.getenv("GEMINI_API_KEY")
     model_name = os.getenv("GEMINI_MODEL_NAME", "gemini-3-pro-preview")
+    genai = _sdk()
     if genai and api_key:
         genai.configure(api_key=api_key)
     return api_key, model_name
@@ -52,7 +59,7 @@ def _should_retry(msg: str) -> bool:
 
 
 def _gen_model(model_name: str):
-    return genai.GenerativeModel(
+    return _sdk().GenerativeModel(
         model_name,
         generation_config={
             "response_mime_type": "application/json",
@@ -75,7 +82,7 @@ def choose_best_code_with_llm(
       GEMINI_ON_429 = "wait" (default): backoff y reintenta hasta 3 veces.
                         "fallback": lanza RuntimeError para que el caller haga fallback.
     """
-    if not genai:
+    if not _sdk():
         raise RuntimeError("Gemini SDK no disponible.")
     api_key, model_name = _configure()
     if not api_key:
@@ -141,7 +148,7 @@ def choose_best_code_batch_with_llm(
     ]
     Devuelve lista de objetos: [{"id": "...", "best_code": "...", "confidence": 0.0, "reason": "..."}]
     """
-    if not genai:
+    if not _sdk():
         raise RuntimeError("Gemini SDK no disponible.")
     api_key, model_name = _configure()
     if not api_key:
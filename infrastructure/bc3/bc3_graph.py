@@ -0,0 +1,292 @@
+# infrastructure/bc3/bc3_graph.py
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from typing import Callable, Iterable, List, Optional, Set
+
+from infrastructure.bc3.concept_store import NO_ID, ConceptStore, csr_groups
+
+
+class Bc3Graph:
+    """
+    Grafo de descomposición (aristas ~D) sobre los ids del `ConceptStore`.
+
+    Hijos y padres se guardan en CSR: `child_ids[child_ptr[i]:child_ptr[i+1]]`
+    son los hijos de `i` en orden de fichero (con repeticiones si el ~D las
+    tiene) y `parent_ids[...]` sus padres distintos, ordenados por código.
+    Todos los recorridos son iterativos y visitan cada nodo una vez, así que
+    ni los presupuestos muy profundos ni los ciclos provocan recursión
+    infinita.
+    """
+
+    __slots__ = (
+        "store",
+        "child_ptr",
+        "child_ids",
+        "parent_ptr",
+        "parent_ids",
+        "_topo",
+        "_cyclic",
+    )
+
+    def __init__(
+        self,
+        store: ConceptStore,
+        child_ptr: array,
+        child_ids: array,
+        parent_ptr: array,
+        parent_ids: array,
+    ) -> None:
+        self.store = store
+        self.child_ptr = child_ptr
+        self.child_ids = child_ids
+        self.parent_ptr = parent_ptr
+        self.parent_ids = parent_ids
+        self._topo: Optional[array] = None
+        self._cyclic: Optional[bytearray] = None
+
+    @classmethod
+    def from_store(cls, store: ConceptStore, *, concepts_only: bool = False) -> "Bc3Graph":
+        """
+        Construye el grafo a partir de las aristas del store. Con
+        `concepts_only` se descartan las aristas cuyo padre o hijo no tiene ~C.
+        """
+        size = len(store)
+        edge_parent = store.edge_parent
+        edge_child = store.edge_child
+        if concepts_only:
+            record = store.record
+            keep = [
+                e
+                for e in range(len(edge_parent))
+                if record[edge_parent[e]] >= 0 and record[edge_child[e]] >= 0
+            ]
+            edge_parent = array("l", (edge_parent[e] for e in keep))
+            edge_child = array("l", (edge_child[e] for e in keep))
+
+        child_ptr, child_edges = csr_groups(edge_parent, size)
+        child_ids = array("l", (edge_child[e] for e in child_edges))
+
+        by_child_ptr, by_child_edges = csr_groups(edge_child, size)
+        codes = store.codes
+        parent_ptr = array("q", [0])
+        parent_ids = array("l")
+        for cid in range(size):
+            lo, hi = by_child_ptr[cid], by_child_ptr[cid + 1]
+            if hi - lo == 1:
+                parent_ids.append(edge_parent[by_child_edges[lo]])
+            elif hi > lo:
+                parents = {edge_parent[e] for e in by_child_edges[lo:hi]}
+                parent_ids.extend(sorted(parents, key=codes.__getitem__))
+            parent_ptr.append(len(parent_ids))
+        return cls(store, child_ptr, child_ids, parent_ptr, parent_ids)
+
+    def __len__(self) -> int:
+        return len(self.child_ptr) - 1
+
+    def children(self, cid: int) -> array:
+        return self.child_ids[self.child_ptr[cid] : self.child_ptr[cid + 1]]
+
+    def parents(self, cid: int) -> array:
+        return self.parent_ids[self.parent_ptr[cid] : self.parent_ptr[cid + 1]]
+
+    def has_parents(self, cid: int) -> bool:
+        return self.parent_ptr[cid + 1] > self.parent_ptr[cid]
+
+    def roots(self) -> List[int]:
+        """Conceptos (~C) sin padre, en orden del primer ~C."""
+        parent_ptr = self.parent_ptr
+        return [cid for cid in self.store.order if parent_ptr[cid + 1] == parent_ptr[cid]]
+
+    # ------------------------------------------------------------------ orden
+
+    def topological_order(self) -> array:
+        """
+        Ids con cada padre antes que sus hijos (Kahn). Los nodos que están en
+        un ciclo, o por debajo de uno, no aparecen: ver `cyclic`.
+        """
+        if self._topo is None:
+            size = len(self)
+            indegree = array("q", bytes(8 * size))
+            for child in self.child_ids:
+                indegree[child] += 1
+            queue = deque(cid for cid in range(size) if indegree[cid] == 0)
+            order = array("l")
+            child_ptr, child_ids = self.child_ptr, self.child_ids
+            while queue:
+                cid = queue.popleft()
+                order.append(cid)
+                for pos in range(child_ptr[cid], child_ptr[cid + 1]):
+                    child = child_ids[pos]
+                    indegree[child] -= 1
+                    if indegree[child] == 0:
+                        queue.append(child)
+            self._topo = order
+        return self._topo
+
+    @property
+    def has_cycles(self) -> bool:
+        return len(self.topological_order()) < len(self)
+
+    def cyclic(self) -> bytearray:
+        """
+        Marca con 1 los nodos que forman parte de algún ciclo (componentes
+        fuertemente conexas de más de un nodo, o nodos que se contienen a sí
+        mismos). Tarjan iterativo.
+        """
+        if self._cyclic is not None:
+            return self._cyclic
+        size = len(self)
+        marks = bytearray(size)
+        if not self.has_cycles:
+            self._cyclic = marks
+            return marks
+
+        child_ptr, child_ids = self.child_ptr, self.child_ids
+        index_of = array("q", [-1]) * size
+        low = array("q", bytes(8 * size))
+        on_stack = bytearray(size)
+        stack: List[int] = []
+        counter = 0
+        for start in range(size):
+            if index_of[start] >= 0:
+                continue
+            work = [(start, child_ptr[start])]
+            index_of[start] = low[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack[start] = 1
+            while work:
+                cid, pos = work[-1]
+                if pos < child_ptr[cid + 1]:
+                    work[-1] = (cid, pos + 1)
+                    child = child_ids[pos]
+                    if index_of[child] < 0:
+                        index_of[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack[child] = 1
+                        work.append((child, child_ptr[child]))
+                    elif on_stack[child]:
+                        low[cid] = min(low[cid], index_of[child])
+                    if child == cid:
+                        marks[cid] = 1
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[cid])
+                if low[cid] == index_of[cid]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == cid:
+                            break
+                    if len(component) > 1:
+                        for member in component:
+                            marks[member] = 1
+        self._cyclic = marks
+        return marks
+
+    def cyclic_codes(self) -> List[str]:
+        codes = self.store.codes
+        return [codes[cid] for cid, mark in enumerate(self.cyclic()) if mark]
+
+    # --------------------------------------------------------------- recorridos
+
+    def postorder(self, roots: Iterable[int]) -> List[int]:
+        """
+        DFS desde `roots` (en ese orden) con los hijos en orden de fichero;
+        cada nodo sale una vez, después de todos sus hijos no visitados. Las
+        aristas que cierran un ciclo se ignoran.
+        """
+        child_ptr, child_ids = self.child_ptr, self.child_ids
+        seen = bytearray(len(self))
+        out: List[int] = []
+        for root in roots:
+            if seen[root]:
+                continue
+            seen[root] = 1
+            work = [(root, child_ptr[root])]
+            while work:
+                cid, pos = work[-1]
+                end = child_ptr[cid + 1]
+                while pos < end and seen[child_ids[pos]]:
+                    pos += 1
+                if pos < end:
+                    child = child_ids[pos]
+                    work[-1] = (cid, pos + 1)
+                    seen[child] = 1
+                    work.append((child, child_ptr[child]))
+                else:
+                    work.pop()
+                    out.append(cid)
+        return out
+
+    def descendants(self, sources: Iterable[int]) -> bytearray:
+        """Marca los nodos alcanzables desde `sources` por al menos una arista."""
+        return _reach(sources, self.child_ptr, self.child_ids, len(self))
+
+    def ancestors(self, sources: Iterable[int]) -> bytearray:
+        """Marca los nodos desde los que se llega a `sources` por al menos una arista."""
+        return _reach(sources, self.parent_ptr, self.parent_ids, len(self))
+
+    def nearest_ancestor(self, cid: int, predicate: Callable[[int], bool]) -> int:
+        """
+        Primer ascendiente de `cid` que cumple `predicate`, en anchura y con
+        los padres en orden de código; NO_ID si no hay ninguno.
+        """
+        parent_ptr, parent_ids = self.parent_ptr, self.parent_ids
+        seen: Set[int] = set()
+        queue = deque([cid])
+        while queue:
+            current = queue.popleft()
+            for pos in range(parent_ptr[current], parent_ptr[current + 1]):
+                parent = parent_ids[pos]
+                if parent in seen:
+                    continue
+                seen.add(parent)
+                if predicate(parent):
+                    return parent
+                queue.append(parent)
+        return NO_ID
+
+    def closest_ancestors(self, cid: int, stop: Callable[[int], bool]) -> Set[int]:
+        """
+        Ascendientes de `cid` que cumplen `stop` sin pasar por otro que
+        también lo cumpla (no se sube por encima de ellos).
+        """
+        parent_ptr, parent_ids = self.parent_ptr, self.parent_ids
+        found: Set[int] = set()
+        seen: Set[int] = set()
+        queue = deque(parent_ids[parent_ptr[cid] : parent_ptr[cid + 1]])
+        while queue:
+            current = queue.popleft()
+            if current in seen:
+                continue
+            seen.add(current)
+            if stop(current):
+                found.add(current)
+                continue
+            for pos in range(parent_ptr[current], parent_ptr[current + 1]):
+                parent = parent_ids[pos]
+                if parent not in seen:
+                    queue.append(parent)
+        return found
+
+
+def _reach(sources: Iterable[int], ptr: array, ids: array, size: int) -> bytearray:
+    marks = bytearray(size)
+    stack: List[int] = []
+    for source in sources:
+        stack.extend(ids[ptr[source] : ptr[source + 1]])
+    while stack:
+        cid = stack.pop()
+        if marks[cid]:
+            continue
+        marks[cid] = 1
+        stack.extend(ids[ptr[cid] : ptr[cid + 1]])
+    return marks
@@ -0,0 +1,485 @@
+# infrastructure/bc3/bc3_index.py
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from infrastructure.bc3.bc3_graph import Bc3Graph
+from infrastructure.bc3.bc3_scanner import (
+    Bc3Record,
+    Buffer,
+    close_bc3_buffer,
+    decode_bc3,
+    open_bc3_buffer,
+    record_offsets,
+)
+from infrastructure.bc3.bc3_writer import write_bc3_bytes
+from infrastructure.bc3.concept_store import (
+    NAN,
+    NO_ID,
+    ConceptMapping,
+    ConceptStore,
+    ConceptView,
+    concept_values,
+    csr_groups,
+    parse_num,
+)
+
+_TILDE = ord("~")
+_PIPE = ord("|")
+_TAG_C = ord("C")
+_TAG_D = ord("D")
+_TAG_T = ord("T")
+_TAG_M = ord("M")
+
+EV_CONCEPT = 0
+EV_DECOMPOSITION = 1
+EV_TEXT = 2
+EV_MEASUREMENT = 3
+
+Event = Tuple[Any, ...]
+Edge = Tuple[str, str, Optional[float]]
+Partial = Tuple[Dict[str, List[str]], Dict[str, array], Dict[str, int]]
+Measurement = Tuple[str, str, str]
+
+
+def _file_stamp(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+@dataclass
+class Bc3Index:
+    """
+    Índice en memoria de un BC3, construido en una sola pasada.
+
+    Los registros se guardan como offsets sobre el buffer del fichero (mmap)
+    y los conceptos en un `ConceptStore` columnar: por concepto solo quedan
+    ints/floats en arrays y el código internado. Descripciones, textos ~T y
+    mediciones se decodifican del buffer cuando alguien los pide.
+
+    - `store`: columnas de conceptos y aristas ~D (ids enteros, CSR de hijos).
+    - `concepts`: código -> `ConceptView`, en orden del primer ~C.
+    - `clones`: clon -> concepto de origen, de los clones "<código>.1" que
+      la fase 1 ha añadido a este contenido (vacío al leer de disco).
+    """
+
+    path: Optional[Path] = None
+    stamp: Optional[Tuple[int, int]] = None
+
+    store: ConceptStore = field(default_factory=ConceptStore, init=False, repr=False)
+    clones: Dict[str, str] = field(default_factory=dict, init=False, repr=False)
+    _buf: Buffer = field(default=b"", init=False, repr=False)
+    _starts: array = field(default_factory=lambda: array("q"), init=False, repr=False)
+    _meas_parent: array = field(default_factory=lambda: array("l"), init=False, repr=False)
+    _meas_child: array = field(default_factory=lambda: array("l"), init=False, repr=False)
+    _meas_record: array = field(default_factory=lambda: array("q"), init=False, repr=False)
+    _graph: Optional[Bc3Graph] = field(default=None, init=False, repr=False)
+    _meas_ptr: Optional[array] = field(default=None, init=False, repr=False)
+    _meas_by_child: Optional[array] = field(default=None, init=False, repr=False)
+    _parents: Optional[Dict[str, List[str]]] = field(
+        default=None,
+        init=False,
+        repr=False,
+    )
+
+    @property
+    def concepts(self) -> ConceptMapping:
+        return ConceptMapping(self.store, self.concept_fields, self._text_by_id)
+
+    def concept(self, code: str) -> Optional[ConceptView]:
+        cid = self.store.id_of(code)
+        if not self.store.is_concept(cid):
+            return None
+        return ConceptView(self.store, cid, self.concept_fields, self._text_by_id)
+
+    def iter_concepts(self) -> Iterator[ConceptView]:
+        concepts = self.concepts
+        for cid in self.store.order:
+            yield concepts.view(cid)
+
+    def concept_fields(self, cid: int) -> List[str]:
+        """Campos del último ~C del concepto (sin la cabecera, sin rellenar)."""
+        rec_no = self.store.record[cid]
+        if rec_no < 0:
+            return []
+        return self.record(rec_no).rstrip("\n")[3:].split("|")
+
+    @classmethod
+    def from_path(cls, path: Path, *, jobs: Optional[int] = None) -> "Bc3Index":
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(path)
+        stamp = _file_stamp(path)
+        return cls.from_buffer(open_bc3_buffer(path), path, stamp, jobs=jobs)
+
+    @classmethod
+    def from_buffer(
+        cls,
+        buf: Buffer,
+        path: Optional[Path] = None,
+        stamp: Optional[Tuple[int, int]] = None,
+        *,
+        jobs: Optional[int] = None,
+    ) -> "Bc3Index":
+        """
+        Indexa `buf`. Con `jobs` > 1 (o <= 0 para usar todas las CPU) y un
+        fichero en disco suficientemente grande, el parseo se reparte entre
+        procesos; el resultado es el mismo que en serie.
+        """
+        index = cls(path=path, stamp=stamp)
+        if path is None or not index._load_parallel(buf, jobs):
+            index._load(buf)
+        return index
+
+    @classmethod
+    def from_state(
+        cls,
+        path: Optional[Path],
+        stamp: Optional[Tuple[int, int]],
+        buf: Buffer,
+        tables: Dict[str, List[str]],
+        columns: Dict[str, array],
+    ) -> "Bc3Index":
+        """Reconstruye el índice a partir de `state()` sin volver a escanear."""
+        index = cls(path=path, stamp=stamp)
+        index._buf = buf
+        index._starts = columns["starts"]
+        index._meas_parent = columns["meas_parent"]
+        index._meas_child = columns["meas_child"]
+        index._meas_record = columns["meas_record"]
+        index.store = ConceptStore.from_state(tables, columns)
+        return index
+
+    def state(self) -> Tuple[Dict[str, List[str]], Dict[str, array]]:
+        columns = self.store.columns()
+        columns["starts"] = self._starts
+        columns["meas_parent"] = self._meas_parent
+        columns["meas_child"] = self._meas_child
+        columns["meas_record"] = self._meas_record
+        return self.store.tables(), columns
+
+    @classmethod
+    def from_bytes(cls, data: bytes, path: Optional[Path] = None) -> "Bc3Index":
+        index = cls(path=path)
+        index._load(data)
+        return index
+
+    @classmethod
+    def from_text(cls, text: str, path: Optional[Path] = None) -> "Bc3Index":
+        return cls.from_bytes(text.encode("latin-1", errors="ignore"), path=path)
+
+    @property
+    def buffer(self) -> Buffer:
+        return self._buf
+
+    def reindex(self, records: Iterable[str]) -> None:
+        self._load("".join(records).encode("latin-1", errors="ignore"))
+
+    def reload(self, data: bytes) -> None:
+        """Vuelve a indexar a partir de los bytes de un `Bc3Writer`."""
+        self._load(data)
+
+    def close(self) -> None:
+        close_bc3_buffer(self._buf)
+        self._buf = b""
+
+    def write(self, path: Optional[Path] = None) -> None:
+        target = Path(path) if path is not None else self.path
+        if target is None:
+            raise ValueError("Bc3Index.write: falta la ruta de destino.")
+        if target == self.path:
+            # En Windows no se puede sobrescribir un fichero mapeado.
+            self._detach()
+        write_bc3_bytes(target, bytes(self._buf))
+        self.path = target
+        self.stamp = _file_stamp(target)
+
+    def is_fresh(self) -> bool:
+        if self.path is None or self.stamp is None or not self.path.exists():
+            return False
+        return _file_stamp(self.path) == self.stamp
+
+    def __len__(self) -> int:
+        return max(0, len(self._starts) - 1)
+
+    def record(self, i: int) -> str:
+        return decode_bc3(self._buf[self._starts[i] : self._starts[i + 1]])
+
+    def raw_record(self, i: int) -> bytes:
+        return self._buf[self._starts[i] : self._starts[i + 1]]
+
+    def record_tag(self, i: int) -> str:
+        """Etiqueta del registro ("~C", "~D"...) o "" si no empieza por "~X|"."""
+        start = self._starts[i]
+        head = self._buf[start : start + 3]
+        if len(head) == 3 and head[0] == _TILDE and head[2] == _PIPE:
+            return head[:2].decode("latin-1")
+        return ""
+
+    def record_field(self, i: int, n: int) -> str:
+        return Bc3Record(self._buf, self._starts[i], self._starts[i + 1]).field(n)
+
+    def iter_records(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def tipo(self, code: str) -> str:
+        return self.store.tipo_of(self.store.id_of(code))
+
+    def text(self, code: str) -> Optional[str]:
+        return self._text_by_id(self.store.id_of(code))
+
+    def _text_by_id(self, cid: int) -> Optional[str]:
+        rec_no = self.store.text_record[cid] if cid >= 0 else -1
+        if rec_no < 0:
+            return None
+        rest = self.record(rec_no).rstrip("\n")[3:]
+        return rest.split("|", 1)[1] if "|" in rest else ""
+
+    def iter_texts(self) -> Iterator[Tuple[str, str]]:
+        codes = self.store.codes
+        text_record = self.store.text_record
+        for cid in self.store.order:
+            if text_record[cid] >= 0:
+                yield codes[cid], self._text_by_id(cid) or ""
+
+    def iter_edges(self) -> Iterator[Edge]:
+        """Aristas ~D (padre, hijo, cantidad numérica o None) en orden de fichero."""
+        store = self.store
+        codes = store.codes
+        for parent, child, qty in zip(store.edge_parent, store.edge_child, store.edge_qty):
+            yield codes[parent], codes[child], None if qty != qty else qty
+
+    def children_of(self, code: str) -> List[str]:
+        cid = self.store.id_of(code)
+        if cid < 0:
+            return []
+        codes = self.store.codes
+        return [codes[child] for child in self.store.children_ids(cid)]
+
+    def iter_measurements(self) -> Iterator[Measurement]:
+        codes = self.store.codes
+        for parent, child, rec_no in zip(
+            self._meas_parent, self._meas_child, self._meas_record
+        ):
+            yield codes[parent], codes[child], self.record(rec_no)
+
+    def measurement_records(self, cid: int) -> List[str]:
+        """Registros ~M cuyo hijo es `cid`, en orden de fichero."""
+        if self._meas_ptr is None:
+            self._meas_ptr, self._meas_by_child = csr_groups(self._meas_child, len(self.store))
+        assert self._meas_by_child is not None
+        if cid < 0 or cid + 1 >= len(self._meas_ptr):
+            return []
+        meas_record = self._meas_record
+        return [
+            self.record(meas_record[m])
+            for m in self._meas_by_child[self._meas_ptr[cid] : self._meas_ptr[cid + 1]]
+        ]
+
+    @property
+    def graph(self) -> Bc3Graph:
+        """Grafo de descomposición (CSR de hijos y padres), construido una vez."""
+        if self._graph is None:
+            self._graph = Bc3Graph.from_store(self.store)
+        return self._graph
+
+    def parents_of(self) -> Dict[str, List[str]]:
+        if self._parents is None:
+            graph = self.graph
+            codes = self.store.codes
+            parents: Dict[str, List[str]] = {}
+            for child in dict.fromkeys(self.store.edge_child):
+                parents[codes[child]] = [codes[p] for p in graph.parents(child)]
+            self._parents = parents
+        return self._parents
+
+    def _detach(self) -> None:
+        if not isinstance(self._buf, bytes):
+            data = bytes(self._buf)
+            close_bc3_buffer(self._buf)
+            self._buf = data
+
+    def _reset(self, buf: Buffer) -> None:
+        if self._buf is not buf:
+            close_bc3_buffer(self._buf)
+        self._buf = buf
+        self.store = ConceptStore()
+        self.clones = {}
+        self._meas_parent = array("l")
+        self._meas_child = array("l")
+        self._meas_record = array("q")
+        self._graph = None
+        self._meas_ptr = None
+        self._meas_by_child = None
+        self._parents = None
+
+    def _load(self, buf: Buffer) -> None:
+        self._reset(buf)
+        self._starts = record_offsets(buf)
+        self._apply_events(iter_events(buf, self._starts))
+
+    def _load_parallel(self, buf: Buffer, jobs: Optional[int]) -> bool:
+        from infrastructure.bc3.bc3_parallel import parse_parallel, resolve_jobs
+
+        n_jobs = resolve_jobs(jobs)
+        if n_jobs < 2 or self.path is None:
+            return False
+        partials = parse_parallel(self.path, buf, n_jobs)
+        if partials is None:
+            return False
+
+        self._reset(buf)
+        starts = array("q")
+        for partial in partials:
+            rec_base = len(starts)
+            starts.extend(partial[1]["starts"][:-1])
+            self._merge_partial(partial, rec_base)
+        starts.append(len(buf))
+        self._starts = starts
+        return True
+
+    @classmethod
+    def parse_range(cls, buf: Buffer, start: int, end: int) -> Partial:
+        """
+        Tablas parciales del trozo `[start, end)` (números de registro locales).
+        Además del estado normal devuelve el primer ~T de cada código en el
+        trozo: si el concepto ya existía en un trozo anterior, ese es su texto.
+        """
+        partial = cls()
+        partial._reset(buf)
+        partial._starts = record_offsets(buf, start, end)
+        first_texts: Dict[str, int] = {}
+
+        def track(events: Iterable[Event]) -> Iterator[Event]:
+            for event in events:
+                if event[0] == EV_TEXT:
+                    first_texts.setdefault(event[2], event[1])
+                yield event
+
+        partial._apply_events(track(iter_events(buf, partial._starts)))
+        tables, columns = partial.state()
+        partial._buf = b""
+        return tables, columns, first_texts
+
+    def _merge_partial(self, partial: Partial, rec_base: int) -> None:
+        """Funde las tablas de un trozo con la semántica del parseo en serie."""
+        tables, columns, first_texts = partial
+        store = self.store
+        text_record = store.text_record
+
+        # ~T de conceptos definidos en trozos anteriores: gana el primero.
+        for code, rec_no in first_texts.items():
+            cid = store.id_of(code)
+            if store.is_concept(cid) and text_record[cid] < 0:
+                text_record[cid] = rec_no + rec_base
+
+        # Los ids locales siguen el orden de aparición dentro del trozo, así
+        # que internarlos en orden reproduce la numeración global.
+        local_ids = array("l", (store.intern(code) for code in tables["codes"]))
+        unit_ids = [store.intern_unit(unit) for unit in tables["units"]]
+        tipo_ids = [store.intern_tipo(tipo) for tipo in tables["tipos"]]
+        record = columns["record"]
+        nfields = columns["nfields"]
+        tipo = columns["tipo"]
+        unit = columns["unit"]
+        price = columns["price"]
+        local_texts = columns["text_record"]
+
+        for lid in columns["order"]:
+            cid = local_ids[lid]
+            store.set_concept(
+                cid,
+                record[lid] + rec_base,
+                nfields[lid],
+                unit_ids[unit[lid]] if unit[lid] >= 0 else NO_ID,
+                price[lid],
+                tipo_ids[tipo[lid]] if tipo[lid] >= 0 else NO_ID,
+            )
+            if local_texts[lid] >= 0 and text_record[cid] < 0:
+                text_record[cid] = local_texts[lid] + rec_base
+
+        store.extend_edges(
+            [local_ids[parent] for parent in columns["edge_parent"]],
+            [local_ids[child] for child in columns["edge_child"]],
+            columns["edge_qty"],
+        )
+
+        self._meas_parent.extend([local_ids[p] for p in columns["meas_parent"]])
+        self._meas_child.extend([local_ids[c] for c in columns["meas_child"]])
+        self._meas_record.extend([r + rec_base for r in columns["meas_record"]])
+
+    def _apply_events(self, events: Iterable[Event]) -> None:
+        store = self.store
+        for event in events:
+            kind = event[0]
+            if kind == EV_CONCEPT:
+                store.add_concept_values(*event[1:])
+
+            elif kind == EV_DECOMPOSITION:
+                parent_id = store.intern(event[2])
+                for child, qty in event[3]:
+                    store.add_edge(parent_id, store.intern(child), qty)
+
+            elif kind == EV_TEXT:
+                cid = store.id_of(event[2])
+                if store.is_concept(cid) and store.text_record[cid] < 0:
+                    store.text_record[cid] = event[1]
+
+            elif kind == EV_MEASUREMENT:
+                self._meas_parent.append(store.intern(event[2]))
+                self._meas_child.append(store.intern(event[3]))
+                self._meas_record.append(event[1])
+
+
+def _decomposition_children(rest: str) -> Tuple[str, List[Tuple[str, float]]]:
+    rest = rest.rstrip("\n")
+    if "|" not in rest:
+        return "", []
+    parent, child_part = rest.split("|", 1)
+    chunks = child_part.rstrip("|").split("\\")
+    qtys = chunks[2::3]
+    n_qtys = len(qtys)
+
+    children: List[Tuple[str, float]] = []
+    for j, child in enumerate(chunks[0::3]):
+        child = child.strip()
+        if child:
+            children.append((child, parse_num(qtys[j]) if j < n_qtys else NAN))
+    return parent, children
+
+
+def iter_events(buf: Buffer, starts: array, first_rec: int = 0) -> Iterator[Event]:
+    """
+    Interpreta los registros delimitados por `starts` y emite un evento por
+    cada ~C, ~D, ~T y ~M relevante, en orden de fichero. Los eventos son
+    tuplas planas (picklables) para poder generarlos en otro proceso.
+    """
+    for i in range(len(starts) - 1):
+        start = starts[i]
+        end = starts[i + 1]
+        if end - start < 3 or buf[start] != _TILDE or buf[start + 2] != _PIPE:
+            continue
+        tag = buf[start + 1]
+        rec_no = first_rec + i
+
+        if tag == _TAG_C:
+            parts = decode_bc3(buf[start + 3 : end]).rstrip("\n").split("|")
+            yield (EV_CONCEPT, rec_no) + concept_values(parts)
+
+        elif tag == _TAG_D:
+            parent, children = _decomposition_children(decode_bc3(buf[start + 3 : end]))
+            if children:
+                yield (EV_DECOMPOSITION, rec_no, parent, children)
+
+        elif tag == _TAG_T:
+            yield (EV_TEXT, rec_no, Bc3Record(buf, start, end).field(1))
+
+        elif tag == _TAG_M:
+            pair = Bc3Record(buf, start, end).field(1)
+            if "\\" in pair:
+                parent, child = pair.split("\\", 1)
+                yield (EV_MEASUREMENT, rec_no, parent, child)
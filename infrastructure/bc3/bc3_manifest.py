@@ -0,0 +1,144 @@
+# infrastructure/bc3/bc3_manifest.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Set
+
+from infrastructure.bc3.bc3_graph import Bc3Graph
+from infrastructure.bc3.bc3_index import Bc3Index
+from infrastructure.bc3.bc3_writer import normalize_newlines
+
+MANIFEST_VERSION = 3
+MANIFEST_SUFFIX = "_manifest.json"
+
+_HASHED_TAGS = {"~C", "~D", "~T"}
+
+
+def concept_hashes(index: Bc3Index) -> Dict[str, str]:
+    """
+    Hash por concepto de su línea ~C, sus ~D (hijos) y su ~T, en orden de
+    fichero y con los saltos de línea normalizados.
+    """
+    hashers: Dict[str, Any] = {}
+    for rec_no in range(len(index)):
+        tag = index.record_tag(rec_no)
+        if tag not in _HASHED_TAGS:
+            continue
+        code = index.record_field(rec_no, 1)
+        hasher = hashers.get(code)
+        if hasher is None:
+            hasher = hashers[code] = hashlib.blake2b(digest_size=16)
+        hasher.update(normalize_newlines(index.raw_record(rec_no)))
+    return {
+        code: hasher.hexdigest()
+        for code, hasher in hashers.items()
+        if code in index.concepts
+    }
+
+
+def changed_concepts(
+    previous: Mapping[str, str],
+    current: Mapping[str, str],
+    graph: Bc3Graph,
+) -> Set[str]:
+    """Conceptos nuevos o modificados más todos sus ascendientes."""
+    changed = {code for code, digest in current.items() if previous.get(code) != digest}
+    store = graph.store
+    ancestors = graph.ancestors(store.id_of(code) for code in changed)
+    changed.update(store.code_of(cid) for cid, mark in enumerate(ancestors) if mark)
+    return changed
+
+
+def payload_hash(payload: Mapping[str, Any]) -> str:
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class Phase2Manifest:
+    """
+    Estado de la última ejecución de un proyecto: hash de cada concepto y la
+    clasificación obtenida para cada descompuesto junto con el hash de la
+    petición que la produjo. Hay uno por BC3 de salida, a su lado.
+
+    `context` identifica con qué se clasificó (proyecto, modelo, prompt,
+    catálogo); con otro contexto nada de lo guardado vale.
+    """
+
+    path: Path
+    context: Dict[str, str] = field(default_factory=dict)
+    concepts: Dict[str, str] = field(default_factory=dict)
+    classified: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def for_output(cls, bc3_out: Path) -> "Phase2Manifest":
+        bc3_out = Path(bc3_out)
+        return cls.load(bc3_out.with_name(bc3_out.stem + MANIFEST_SUFFIX))
+
+    @classmethod
+    def load(cls, path: Path) -> "Phase2Manifest":
+        path = Path(path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls(path=path)
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return cls(path=path)
+        return cls(
+            path=path,
+            context={str(k): str(v) for k, v in (data.get("context") or {}).items()},
+            concepts=dict(data.get("concepts") or {}),
+            classified=dict(data.get("classified") or {}),
+        )
+
+    def bind(self, context: Mapping[str, str]) -> bool:
+        """
+        Fija el contexto de esta ejecución. Si no coincide con el guardado se
+        descarta todo el estado y devuelve False.
+        """
+        context = {str(k): str(v) for k, v in context.items()}
+        if context == self.context:
+            return True
+        self.context = context
+        self.concepts = {}
+        self.classified = {}
+        return False
+
+    def reusable(
+        self,
+        code: str,
+        payload_digest: str,
+        changed: Set[str],
+    ) -> Optional[Dict[str, Any]]:
+        if code in changed:
+            return None
+        entry = self.classified.get(code)
+        if not entry or entry.get("payload") != payload_digest:
+            return None
+        return entry
+
+    def save(self) -> None:
+        data = {
+            "version": MANIFEST_VERSION,
+            "context": self.context,
+            "concepts": self.concepts,
+            "classified": self.classified,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(
+            prefix=self.path.name,
+            suffix=".tmp",
+            dir=self.path.parent,
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh, ensure_ascii=False)
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
@@ -5,6 +5,13 @@ import re
 from collections import defaultdict
 from pathlib import Path
 
+from infrastructure.bc3.bc3_index import Bc3Index
+from infrastructure.bc3.bc3_snapshot import load_bc3_index
+from infrastructure.bc3.bc3_writer import Bc3Writer, is_clean_record, normalize_newlines
+from infrastructure.bc3.code_remapper import CodeRemapper
+from infrastructure.bc3.concept_store import ConceptStore
+from utils.memo import memoized
+from utils.rtf_text import is_rtf, rtf_to_text
 from utils.text_sanitize import clean_text
 
 MAX_CODE_LEN = 20
@@ -31,7 +38,11 @@ def _fmt_num(value: float | None) -> str:
     return f"{value:.15g}".replace(",", ".")
 
 
-def _shorten_code_unique(code: str, used: dict[str, str]) -> str:
+def _shorten_code_unique(
+    code: str,
+    used: dict[str, str],
+    next_suffix: dict[str, int] | None = None,
+) -> str:
     if len(code) <= MAX_CODE_LEN:
         return code
 
@@ -45,13 +56,18 @@ def _shorten_code_unique(code: str, used: dict[str, str]) -> str:
         used[alt] = code
         return alt
 
-    i = 1
+    # `used` solo crece: los sufijos ya descartados para este prefijo siguen
+    # ocupados, así que se continúa desde el último probado.
+    prefix = code[: MAX_CODE_LEN - 2]
+    i = next_suffix.get(prefix, 1) if next_suffix is not None else 1
     while True:
         suffix = f"#{i}"
         cutoff = MAX_CODE_LEN - len(suffix)
         candidate = code[:cutoff] + suffix
         if candidate not in used:
             used[candidate] = code
+            if next_suffix is not None:
+                next_suffix[prefix] = i + 1
             return candidate
         i += 1
 
@@ -196,6 +212,7 @@ def _unit_unify(unit_raw: str) -> str:
     return unit.upper()
 
 
+@memoized("unit_normalized", maxsize=4096)
 def _unit_normalized(unit_raw: str) -> str:
     unit = _unit_unify(unit_raw or "")
     if not unit:
@@ -210,78 +227,66 @@ def _unit_normalized(unit_raw: str) -> str:
     return DEFAULT_UNIT
 
 
-def _collect_info(src: Path):
+def _collect_info(index: Bc3Index):
     code_map: dict[str, str] = {}
-    tipo_map: dict[str, str] = {}
-    children_map: dict[str, list[str]] = defaultdict(list)
-    price_map: dict[str, str] = {}
     meas_pair_map: dict[tuple[str, str], float] = defaultdict(float)
 
     used_short: dict[str, str] = {}
+    next_suffix: dict[str, int] = {}
 
-    with src.open("r", encoding="latin-1", errors="ignore") as fh:
-        for raw in fh:
-            if raw.startswith("~C|"):
-                _, rest = raw.split("|", 1)
-                parts = rest.rstrip("\n").split("|")
-                if len(parts) >= 6:
-                    code = parts[0]
-                    tipo = parts[5]
-
-                    tipo_map[code] = tipo
-                    price_map[code] = parts[3] if len(parts) > 3 else ""
-
-                    if len(code) > MAX_CODE_LEN:
-                        if code not in code_map:
-                            short = _shorten_code_unique(code, used_short)
-                            code_map[code] = short
-                    else:
-                        if code not in used_short:
-                            used_short[code] = code
-
-            elif raw.startswith("~D|"):
-                _, rest = raw.split("|", 1)
-                parent_code, child_part = rest.split("|", 1)
-                chunks = child_part.rstrip("|\n").split("\\")
-                for i in range(0, len(chunks), 3):
-                    child_code = (chunks[i] if i < len(chunks) else "").strip()
-                    if child_code:
-                        children_map[parent_code].append(child_code)
-
-            elif raw.startswith("~M|"):
-                parts = raw.rstrip("\n").split("|")
-                if len(parts) >= 4:
-                    pair = parts[1]
-                    qty_str = parts[3]
-                    if "\\" in pair:
-                        parent, child = pair.split("\\", 1)
-                        qty = _to_float(qty_str)
-                        if qty is not None:
-                            meas_pair_map[(parent, child)] += qty
-
-    return code_map, tipo_map, children_map, price_map, meas_pair_map
-
-
-def _compute_force_material(
-    tipo_map: dict[str, str],
-    children_map: dict[str, list[str]],
-) -> set[str]:
-    force_mat: set[str] = set()
-
-    def dfs(code: str) -> None:
-        for child in children_map.get(code, []):
-            if child not in force_mat:
-                force_mat.add(child)
-                dfs(child)
-
-    for code, tipo in tipo_map.items():
-        if tipo == "0" and "#" not in code:
-            dfs(code)
-    return force_mat
+    store = index.store
+    for cid in store.order:
+        if store.nfields[cid] < 6:
+            continue
+        code = store.code_of(cid)
+
+        if len(code) > MAX_CODE_LEN:
+            if code not in code_map:
+                code_map[code] = _shorten_code_unique(code, used_short, next_suffix)
+        elif code not in used_short:
+            used_short[code] = code
+
+    for parent, child, record in index.iter_measurements():
+        parts = record.rstrip("\n").split("|")
+        if len(parts) >= 4:
+            qty = _to_float(parts[3])
+            if qty is not None:
+                meas_pair_map[(parent, child)] += qty
+
+    return code_map, meas_pair_map
+
+
+def _tipo_of(store: ConceptStore, code: str) -> str | None:
+    cid = store.id_of(code)
+    if cid < 0 or store.nfields[cid] < 6:
+        return None
+    return store.tipo_of(cid)
+
+
+def _has(flags: bytearray, store: ConceptStore, code: str) -> bool:
+    cid = store.id_of(code)
+    return cid >= 0 and bool(flags[cid])
 
 
+def _compute_force_material(index: Bc3Index) -> bytearray:
+    """Todo lo que cuelga (a cualquier profundidad) de una partida."""
+    store = index.store
+    partidas = [
+        cid
+        for cid in store.order
+        if store.nfields[cid] >= 6
+        and store.tipo_of(cid) == "0"
+        and "#" not in store.code_of(cid)
+    ]
+    return index.graph.descendants(partidas)
+
+
+# Restos de RTF ya aplanado a texto (sin "{\rtf"): palabras de control
+# convertidas en "w12_..." o "_header_...". Un cuerpo RTF real lo decodifica
+# `rtf_to_text` y no pasa por aquí.
+_RTF_LEADING_TOKEN = r"\s*w\d{2,}_[^\s()|]*"
 _RTF_GARBAGE_PATTERNS = [
-    r"^\s*w\d{2,}_[^\s()|]*",
+    "^" + _RTF_LEADING_TOKEN,
     r"\(?_rtf_ansi[^\)|]*\)?",
     r"\(?_fonttbl[^\)|]*\)?",
     r"\(?_colortbl[^\)|]*\)?",
@@ -291,213 +296,246 @@ _RTF_GARBAGE_PATTERNS = [
     r"\(?_plain_pard[^\)|]*\)?",
 ]
 _RTF_GARBAGE_RE = re.compile("|".join(_RTF_GARBAGE_PATTERNS), flags=re.IGNORECASE)
+# Tras la primera pasada solo puede volver a casar el patrón anclado al
+# inicio, con los tokens que quedaban detrás del primero (hasta 4 más, como
+# las 5 pasadas del bucle original): se quitan todos de una vez.
+_RTF_LEADING_RE = re.compile(f"^(?:{_RTF_LEADING_TOKEN}){{1,4}}", flags=re.IGNORECASE)
+_DOTS_RE = re.compile(r"[.]{3,}")
+_SPACES_RE = re.compile(r"\s{2,}")
 
 
+@memoized("strip_rtf_artifacts", maxsize=8192)
 def _strip_rtf_artifacts(txt: str) -> str:
-    out = txt
-    for _ in range(5):
-        new = _RTF_GARBAGE_RE.sub(" ", out)
-        if new == out:
-            break
-        out = new
-    out = re.sub(r"[.]{3,}", "..", out)
-    out = re.sub(r"\s{2,}", " ", out).strip()
-    return out
-
-
-def convert_to_material(src: Path, dst: Path) -> None:
-    if not src.exists():
-        raise FileNotFoundError(src)
-
-    code_map, tipo_map, children_map, price_map, meas_pair_map = _collect_info(src)
-    force_mat = _compute_force_material(tipo_map, children_map)
-
-    all_children: set[str] = {
-        child for children in children_map.values() for child in children
-    }
+    if is_rtf(txt):
+        out = rtf_to_text(txt)
+    elif "_" in txt:
+        # Todos los restos llevan "_": sin él no hay nada que quitar.
+        out = _RTF_GARBAGE_RE.sub(" ", txt)
+        out = _RTF_LEADING_RE.sub(" ", out, count=1)
+    else:
+        out = txt
+    if "..." in out:
+        out = _DOTS_RE.sub("..", out)
+    return _SPACES_RE.sub(" ", out).strip()
+
+
+def _clean_line(line: str) -> str:
+    cleaned = clean_text(line)
+    return cleaned + "\n" if cleaned else ""
+
+
+def convert_to_material(
+    src: Path,
+    dst: Path,
+    *,
+    index: Bc3Index | None = None,
+    write: bool = True,
+) -> Bc3Index:
+    """
+    Convierte `src` y devuelve el índice del resultado. Con `write=False` el
+    resultado se queda en memoria (asociado a `dst`, sin escribir) para que
+    otra fase lo complete y lo escriba una sola vez.
+    """
+    if index is None:
+        if not src.exists():
+            raise FileNotFoundError(src)
+        index = load_bc3_index(src)
+
+    store = index.store
+    code_map, meas_pair_map = _collect_info(index)
+    force_mat = _compute_force_material(index)
+
+    all_children = bytearray(len(store))
+    for child in store.edge_child:
+        all_children[child] = 1
 
     dst.parent.mkdir(parents=True, exist_ok=True)
 
-    repl_pattern = (
-        re.compile(
-            r"("
-            + "|".join(re.escape(key) for key in code_map.keys())
-            + r")(?=[\\|])"
-        )
-        if code_map
-        else None
-    )
+    remapper = CodeRemapper(code_map)
 
-    need_cd_parent = "CD#" not in tipo_map
+    need_cd_parent = _tipo_of(store, "CD#") is None
     super_root: str | None = None
     super_d_rewritten = False
     cd_concept_written = False
 
-    with src.open("r", encoding="latin-1", errors="ignore") as fin, dst.open(
-        "w",
-        encoding="latin-1",
-        errors="ignore",
-    ) as fout:
-        for raw in fin:
-            line = raw
-
-            if raw.startswith("~C|"):
-                head, rest = raw.split("|", 1)
-                parts = rest.rstrip("\n").split("|")
-                while len(parts) < 6:
-                    parts.append("")
-
-                orig_code = parts[0]
-                unidad = parts[1]
-                desc = parts[2]
-                pres = parts[3]
-                tipo = parts[5]
-
-                if super_root is None and orig_code.endswith("##"):
-                    super_root = orig_code
-
-                code_out = code_map.get(orig_code, orig_code)
-                parts[0] = code_out
-
-                if tipo in {"1", "2", "3"}:
-                    parts[5] = "3"
-                    tipo = "3"
-
-                if orig_code in force_mat:
-                    orig_tipo = tipo_map.get(orig_code, tipo)
-                    if orig_tipo == "0":
-                        parts[3] = price_map.get(orig_code, pres)
-                    parts[5] = "3"
-                    tipo = "3"
-
-                is_desc = (
-                    tipo == "3"
-                    or orig_code in all_children
-                    or orig_code in force_mat
-                )
-                is_partida = tipo == "0" and "#" not in orig_code
-                if is_desc or is_partida:
-                    parts[1] = _unit_normalized(unidad)
-
-                parts[2] = clean_text(desc)
-
-                line = f"{head}|{'|'.join(parts)}|\n"
-                line = clean_text(line)
-                fout.write(line)
+    out = Bc3Writer()
+    for rec_no in range(len(index)):
+        if index.record_tag(rec_no) not in {"~C", "~D", "~T"}:
+            raw_bytes = normalize_newlines(index.raw_record(rec_no))
+            remapped = remapper.remap(raw_bytes)
+            if remapped is None and is_clean_record(raw_bytes):
+                out.copy(raw_bytes)
+                continue
+            if remapped is not None:
+                out.write(_clean_line(remapped.decode("latin-1")))
                 continue
 
-            if raw.startswith("~D|"):
-                _tag, rest = raw.split("|", 1)
-                parent_code, child_part = rest.split("|", 1)
-
-                body_no_nl = child_part.rstrip("\n")
-                tail_bs_match = re.search(r"(\\+)\|\s*$", body_no_nl)
-                tail_bslashes = tail_bs_match.group(1) if tail_bs_match else "\\"
-                if body_no_nl.endswith("|"):
-                    body_no_nl = body_no_nl[:-1]
-
-                chunks = body_no_nl.split("\\")
-                triplets: list[str] = []
-                i = 0
-                while i < len(chunks):
-                    child_code = (chunks[i] if i < len(chunks) else "").strip()
-                    coef = chunks[i + 1] if i + 1 < len(chunks) else ""
-                    qty = chunks[i + 2] if i + 2 < len(chunks) else ""
-                    i += 3
-
-                    if not child_code:
-                        continue
-
-                    if (
-                        tipo_map.get(child_code) == "0"
-                        and child_code in force_mat
-                    ):
-                        qty_is_zero = qty.strip() in {
-                            "",
-                            "0",
-                            "0.0",
-                            "0.00",
-                            "0,0",
-                            "0,00",
-                        }
-                        if qty_is_zero:
-                            meas = meas_pair_map.get((parent_code, child_code))
-                            if (meas is not None) and (meas > 0):
-                                qty = _fmt_num(meas)
-
-                    child_code_out = code_map.get(child_code, child_code)
-                    triplets.extend([child_code_out, coef, qty])
+        raw = index.record(rec_no)
+        line = raw
+
+        if raw.startswith("~C|"):
+            head, rest = raw.split("|", 1)
+            parts = rest.rstrip("\n").split("|")
+            while len(parts) < 6:
+                parts.append("")
+
+            orig_code = parts[0]
+            unidad = parts[1]
+            desc = parts[2]
+            pres = parts[3]
+            tipo = parts[5]
+
+            if super_root is None and orig_code.endswith("##"):
+                super_root = orig_code
+
+            code_out = code_map.get(orig_code, orig_code)
+            parts[0] = code_out
+
+            if tipo in {"1", "2", "3"}:
+                parts[5] = "3"
+                tipo = "3"
+
+            if _has(force_mat, store, orig_code):
+                orig_tipo = _tipo_of(store, orig_code)
+                if orig_tipo is None:
+                    orig_tipo = tipo
+                if orig_tipo == "0":
+                    concept = index.concept(orig_code)
+                    if concept is not None and concept.nfields >= 6:
+                        parts[3] = concept.price_txt
+                    else:
+                        parts[3] = pres
+                parts[5] = "3"
+                tipo = "3"
+
+            is_desc = (
+                tipo == "3"
+                or _has(all_children, store, orig_code)
+                or _has(force_mat, store, orig_code)
+            )
+            is_partida = tipo == "0" and "#" not in orig_code
+            if is_desc or is_partida:
+                parts[1] = _unit_normalized(unidad)
+
+            parts[2] = clean_text(desc)
+
+            line = f"{head}|{'|'.join(parts)}|\n"
+            out.write(_clean_line(line))
+            continue
+
+        if raw.startswith("~D|"):
+            _tag, rest = raw.split("|", 1)
+            parent_code, child_part = rest.split("|", 1)
+
+            body_no_nl = child_part.rstrip("\n")
+            tail_bs_match = re.search(r"(\\+)\|\s*$", body_no_nl)
+            tail_bslashes = tail_bs_match.group(1) if tail_bs_match else "\\"
+            if body_no_nl.endswith("|"):
+                body_no_nl = body_no_nl[:-1]
+
+            chunks = body_no_nl.split("\\")
+            triplets: list[str] = []
+            i = 0
+            while i < len(chunks):
+                child_code = (chunks[i] if i < len(chunks) else "").strip()
+                coef = chunks[i + 1] if i + 1 < len(chunks) else ""
+                qty = chunks[i + 2] if i + 2 < len(chunks) else ""
+                i += 3
+
+                if not child_code:
+                    continue
 
                 if (
-                    need_cd_parent
-                    and (super_root is not None)
-                    and (parent_code == super_root)
-                    and not super_d_rewritten
+                    _tipo_of(store, child_code) == "0"
+                    and _has(force_mat, store, child_code)
                 ):
-                    line_super = f"~D|{super_root}|CD#\\1\\1\\1|\n"
-                    line_super = clean_text(line_super)
-                    line_super = _ensure_d_trailing_backslash(line_super)
-                    fout.write(line_super)
-
-                    if not cd_concept_written:
-                        fout.write("~C|CD#||COSTE DIRECTO|||0|\n")
-                        cd_concept_written = True
-
-                    children_body = "\\".join(triplets)
-                    line_cd = f"~D|CD#|{children_body}|\n"
-                    line_cd = clean_text(line_cd)
-                    line_cd = _ensure_d_trailing_backslash(line_cd)
-                    fout.write(line_cd)
-
-                    super_d_rewritten = True
-                    continue
-
-                rebuilt = "\\".join(triplets) + tail_bslashes
-                parent_code_out = code_map.get(parent_code, parent_code)
-                line = f"~D|{parent_code_out}|{rebuilt}|\n"
-                line = clean_text(line)
-                line = _ensure_d_trailing_backslash(line)
-                fout.write(line)
+                    qty_is_zero = qty.strip() in {
+                        "",
+                        "0",
+                        "0.0",
+                        "0.00",
+                        "0,0",
+                        "0,00",
+                    }
+                    if qty_is_zero:
+                        meas = meas_pair_map.get((parent_code, child_code))
+                        if (meas is not None) and (meas > 0):
+                            qty = _fmt_num(meas)
+
+                child_code_out = code_map.get(child_code, child_code)
+                triplets.extend([child_code_out, coef, qty])
+
+            if (
+                need_cd_parent
+                and (super_root is not None)
+                and (parent_code == super_root)
+                and not super_d_rewritten
+            ):
+                line_super = f"~D|{super_root}|CD#\\1\\1\\1|\n"
+                line_super = clean_text(line_super)
+                line_super = _ensure_d_trailing_backslash(line_super)
+                out.write(line_super)
+
+                if not cd_concept_written:
+                    out.write("~C|CD#||COSTE DIRECTO|||0|\n")
+                    cd_concept_written = True
+
+                children_body = "\\".join(triplets)
+                line_cd = f"~D|CD#|{children_body}|\n"
+                line_cd = clean_text(line_cd)
+                line_cd = _ensure_d_trailing_backslash(line_cd)
+                out.write(line_cd)
+
+                super_d_rewritten = True
                 continue
 
-            if raw.startswith("~T|"):
-                try:
-                    _tag, rest = raw.split("|", 1)
-                    code, txt = (rest.rstrip("\n").split("|", 1) + [""])[:2]
-                    code_out = code_map.get(code, code)
-                    txt = _strip_rtf_artifacts(txt)
-                    txt_out = clean_text(txt)
-                    line = f"~T|{code_out}|{txt_out}|\n"
-                except Exception:
-                    line = clean_text(raw.rstrip("\n")) + "\n"
-                fout.write(clean_text(line))
-                continue
+            rebuilt = "\\".join(triplets) + tail_bslashes
+            parent_code_out = code_map.get(parent_code, parent_code)
+            line = f"~D|{parent_code_out}|{rebuilt}|\n"
+            line = clean_text(line)
+            line = _ensure_d_trailing_backslash(line)
+            out.write(line)
+            continue
 
-            if repl_pattern:
-                line = repl_pattern.sub(
-                    lambda match: code_map[match.group(1)],
-                    raw.rstrip("\n"),
-                ) + "\n"
-
-            fout.write(clean_text(line))
-
-        if need_cd_parent and (super_root is not None) and not super_d_rewritten:
-            orig_children = children_map.get(super_root, [])
-            triplets = []
-            for child in orig_children:
-                child_out = code_map.get(child, child)
-                triplets.extend([child_out, "1", "1"])
-
-            line_super = f"~D|{super_root}|CD#\\1\\1\\1|\n"
-            line_super = clean_text(line_super)
-            line_super = _ensure_d_trailing_backslash(line_super)
-            fout.write(line_super)
-
-            if not cd_concept_written:
-                fout.write("~C|CD#||COSTE DIRECTO|||0|\n")
-
-            children_body = "\\".join(triplets)
-            line_cd = f"~D|CD#|{children_body}|\n"
-            line_cd = clean_text(line_cd)
-            line_cd = _ensure_d_trailing_backslash(line_cd)
-            fout.write(line_cd)
+        if raw.startswith("~T|"):
+            try:
+                _tag, rest = raw.split("|", 1)
+                code, txt = (rest.rstrip("\n").split("|", 1) + [""])[:2]
+                code_out = code_map.get(code, code)
+                txt = _strip_rtf_artifacts(txt)
+                txt_out = clean_text(txt)
+                line = f"~T|{code_out}|{txt_out}|\n"
+            except Exception:
+                line = clean_text(raw.rstrip("\n")) + "\n"
+            out.write(_clean_line(line))
+            continue
+
+        out.write(_clean_line(line))
+
+    if need_cd_parent and (super_root is not None) and not super_d_rewritten:
+        orig_children = index.children_of(super_root)
+        triplets = []
+        for child in orig_children:
+            child_out = code_map.get(child, child)
+            triplets.extend([child_out, "1", "1"])
+
+        line_super = f"~D|{super_root}|CD#\\1\\1\\1|\n"
+        line_super = clean_text(line_super)
+        line_super = _ensure_d_trailing_backslash(line_super)
+        out.write(line_super)
+
+        if not cd_concept_written:
+            out.write("~C|CD#||COSTE DIRECTO|||0|\n")
+
+        children_body = "\\".join(triplets)
+        line_cd = f"~D|CD#|{children_body}|\n"
+        line_cd = clean_text(line_cd)
+        line_cd = _ensure_d_trailing_backslash(line_cd)
+        out.write(line_cd)
+
+    data = out.getvalue()
+    del out
+    index_out = Bc3Index.from_bytes(data, path=dst)
+    if write:
+        index_out.write()
+    return index_out
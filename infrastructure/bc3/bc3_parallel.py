@@ -0,0 +1,73 @@
+# infrastructure/bc3/bc3_parallel.py
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from infrastructure.bc3.bc3_index import Bc3Index, Partial
+from infrastructure.bc3.bc3_scanner import (
+    Buffer,
+    close_bc3_buffer,
+    next_record_start,
+    open_bc3_buffer,
+)
+
+# Por debajo de este tamaño por trozo no compensa arrancar procesos.
+MIN_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def resolve_jobs(jobs: Optional[int]) -> int:
+    """`jobs` <= 0 significa "un proceso por CPU"."""
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def chunk_ranges(
+    buf: Buffer,
+    jobs: int,
+    min_chunk: int = MIN_CHUNK_BYTES,
+) -> List[Tuple[int, int]]:
+    """
+    Parte `buf` en como mucho `jobs` rangos de bytes que empiezan en un
+    inicio de registro ("~X|"), salvo el primero, que empieza en 0.
+    """
+    size = len(buf)
+    n_chunks = max(1, min(jobs, size // max(1, min_chunk)))
+    bounds = [0]
+    for k in range(1, n_chunks):
+        # Se retrocede 2 bytes para no partir una cabecera "~X|" a la mitad.
+        pos = next_record_start(buf, max(bounds[-1] + 1, k * size // n_chunks - 2))
+        if pos < 0:
+            break
+        bounds.append(pos)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def parse_chunk(task: Tuple[str, int, int]) -> Partial:
+    """Worker: tablas parciales del rango `[start, end)` de `path`."""
+    path, start, end = task
+    buf = open_bc3_buffer(Path(path))
+    try:
+        return Bc3Index.parse_range(buf, start, end)
+    finally:
+        close_bc3_buffer(buf)
+
+
+def parse_parallel(path: Path, buf: Buffer, jobs: int) -> Optional[List[Partial]]:
+    """
+    Parsea `path` en `jobs` procesos. Devuelve las tablas parciales de cada
+    trozo en orden de fichero (con números de registro locales), o None si el
+    fichero es demasiado pequeño para repartirlo.
+    """
+    ranges = chunk_ranges(buf, jobs, MIN_CHUNK_BYTES)
+    if len(ranges) < 2:
+        return None
+    tasks = [(str(path), start, end) for start, end in ranges]
+    with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+        return list(pool.map(parse_chunk, tasks))
@@ -0,0 +1,158 @@
+# infrastructure/bc3/bc3_scanner.py
+from __future__ import annotations
+
+import mmap
+import re
+from array import array
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+Buffer = Union[bytes, mmap.mmap]
+
+_RECORD_START_RE = re.compile(rb"~[A-Z]\|")
+
+
+def decode_bc3(raw: bytes | memoryview) -> str:
+    """
+    Decodifica bytes de un BC3 igual que la lectura en modo texto que se usaba
+    antes (latin-1 + saltos de línea universales).
+    """
+    text = bytes(raw).decode("latin-1")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def open_bc3_buffer(path: Path) -> Buffer:
+    with Path(path).open("rb") as fh:
+        fh.seek(0, 2)
+        if fh.tell() == 0:
+            return b""
+        return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def close_bc3_buffer(buf: Buffer) -> None:
+    if isinstance(buf, mmap.mmap):
+        try:
+            buf.close()
+        except BufferError:
+            # Aún hay memoryviews vivas; el mapa se libera al recolectarlas.
+            pass
+
+
+class Bc3Record:
+    """Registro BC3 como rango de bytes; solo decodifica lo que se pide."""
+
+    __slots__ = ("buf", "start", "end")
+
+    def __init__(self, buf: Buffer, start: int, end: int) -> None:
+        self.buf = buf
+        self.start = start
+        self.end = end
+
+    @property
+    def tag(self) -> str:
+        head = self.buf[self.start : self.start + 3]
+        if len(head) == 3 and head[:1] == b"~" and head[2:3] == b"|":
+            return head.decode("latin-1")
+        return ""
+
+    @property
+    def view(self) -> memoryview:
+        return memoryview(self.buf)[self.start : self.end]
+
+    def raw(self) -> bytes:
+        return self.buf[self.start : self.end]
+
+    def text(self) -> str:
+        return decode_bc3(self.buf[self.start : self.end])
+
+    def field(self, n: int) -> str:
+        """
+        Campo `n` del registro separando por '|' (0 es la cabecera "~C").
+        El último campo se devuelve sin el salto de línea final.
+        """
+        buf = self.buf
+        pos = self.start
+        for _ in range(n):
+            sep = buf.find(b"|", pos, self.end)
+            if sep < 0:
+                return ""
+            pos = sep + 1
+        sep = buf.find(b"|", pos, self.end)
+        if sep < 0:
+            return decode_bc3(buf[pos : self.end]).rstrip("\n")
+        return decode_bc3(buf[pos:sep])
+
+
+def next_record_start(buf: Buffer, pos: int) -> int:
+    """Offset del primer "~X|" en `buf[pos:]`, o -1 si no hay más registros."""
+    match = _RECORD_START_RE.search(buf, pos)
+    return match.start() if match is not None else -1
+
+
+def iter_record_starts(
+    buf: Buffer,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator[int]:
+    stop = len(buf) if end is None else end
+    for match in _RECORD_START_RE.finditer(buf, start, stop):
+        yield match.start()
+
+
+def record_offsets(
+    buf: Buffer,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> array:
+    """
+    Offsets de inicio de cada registro de `buf[start:end]` más un centinela
+    final, de modo que el registro i ocupa `offsets[i]:offsets[i + 1]`.
+    """
+    stop = len(buf) if end is None else end
+    offsets = array("q")
+    if stop <= start:
+        offsets.append(start)
+        return offsets
+    offsets.extend(iter_record_starts(buf, start, stop))
+    if not offsets or offsets[0] != start:
+        offsets.insert(0, start)
+    offsets.append(stop)
+    return offsets
+
+
+def scan_bc3(
+    buf: Buffer,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator[Bc3Record]:
+    """
+    Recorre los registros de `buf[start:end]`. Lo que haya antes del primer
+    "~X|" se devuelve como un registro sin etiqueta para poder copiarlo tal cual.
+    """
+    offsets = record_offsets(buf, start, end)
+    for i in range(len(offsets) - 1):
+        yield Bc3Record(buf, offsets[i], offsets[i + 1])
+
+
+class Bc3Scanner:
+    """Abre un BC3 con mmap y recorre sus registros sin copiarlo a memoria."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.buffer: Buffer = b""
+
+    def __enter__(self) -> "Bc3Scanner":
+        self.buffer = open_bc3_buffer(self.path)
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        close_bc3_buffer(self.buffer)
+        self.buffer = b""
+
+    def __iter__(self) -> Iterator[Bc3Record]:
+        return scan_bc3(self.buffer)
@@ -0,0 +1,253 @@
+# infrastructure/bc3/bc3_snapshot.py
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from infrastructure.bc3.bc3_index import Bc3Index
+from infrastructure.bc3.bc3_scanner import Buffer, close_bc3_buffer, open_bc3_buffer
+
+_MAGIC = b"BC3SNAP\x01"
+_HEADER = struct.Struct("<8sBQq")
+_ENTRY = struct.Struct("<B32sQ")
+_KIND_ARRAY = 1
+_KIND_STRINGS = 2
+_SUFFIX = ".bc3snap"
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def content_digest(buf: Buffer) -> str:
+    return hashlib.blake2b(buf, digest_size=20).hexdigest()
+
+
+def _byteorder_flag() -> int:
+    return 0 if sys.byteorder == "little" else 1
+
+
+def _write_entry(fh: BinaryIO, name: str, kind: int, payload: bytes) -> None:
+    fh.write(_ENTRY.pack(kind, name.encode("ascii"), len(payload)))
+    fh.write(payload)
+
+
+def _pack_array(values: array) -> bytes:
+    return values.typecode.encode("ascii") + bytes([values.itemsize]) + values.tobytes()
+
+
+def _unpack_array(payload: bytes) -> array:
+    typecode = payload[:1].decode("ascii")
+    values = array(typecode)
+    if payload[1] != values.itemsize:
+        raise ValueError(f"snapshot: tamaño de '{typecode}' distinto en esta plataforma")
+    values.frombytes(payload[2:])
+    return values
+
+
+def _pack_strings(values: List[str]) -> bytes:
+    blob = "\0".join(values).encode("utf-8", errors="surrogatepass")
+    lengths = array("q", (len(value) for value in values))
+    return struct.pack("<Q", len(values)) + lengths.tobytes() + blob
+
+
+def _unpack_strings(payload: bytes) -> List[str]:
+    (count,) = struct.unpack_from("<Q", payload)
+    lengths = array("q")
+    lengths.frombytes(payload[8 : 8 + 8 * count])
+    text = payload[8 + 8 * count :].decode("utf-8", errors="surrogatepass")
+    values: List[str] = []
+    pos = 0
+    for length in lengths:
+        values.append(text[pos : pos + length])
+        pos += length + 1
+    return values
+
+
+def write_snapshot(index: Bc3Index, target: Path, digest: str) -> None:
+    """Guarda las estructuras del índice (no el BC3) en `target`."""
+    if index.stamp is None:
+        raise ValueError("write_snapshot: el índice no está asociado a un fichero.")
+    tables, columns = index.state()
+    size, mtime_ns = index.stamp
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=target.name, suffix=".tmp", dir=target.parent)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(_HEADER.pack(_MAGIC, _byteorder_flag(), size, mtime_ns))
+            fh.write(bytes.fromhex(digest))
+            for name, values in tables.items():
+                _write_entry(fh, name, _KIND_STRINGS, _pack_strings(values))
+            for name, column in columns.items():
+                _write_entry(fh, name, _KIND_ARRAY, _pack_array(column))
+        os.replace(tmp_name, target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def read_snapshot(
+    source: Path,
+) -> Tuple[str, Tuple[int, int], Dict[str, List[str]], Dict[str, array]]:
+    data = source.read_bytes()
+    magic, order, size, mtime_ns = _HEADER.unpack_from(data)
+    if magic != _MAGIC or order != _byteorder_flag():
+        raise ValueError(f"snapshot no compatible: {source}")
+    pos = _HEADER.size
+    digest = data[pos : pos + 20].hex()
+    pos += 20
+
+    tables: Dict[str, List[str]] = {}
+    columns: Dict[str, array] = {}
+    while pos < len(data):
+        kind, raw_name, length = _ENTRY.unpack_from(data, pos)
+        pos += _ENTRY.size
+        name = raw_name.rstrip(b"\0").decode("ascii")
+        payload = data[pos : pos + length]
+        pos += length
+        if kind == _KIND_STRINGS:
+            tables[name] = _unpack_strings(payload)
+        elif kind == _KIND_ARRAY:
+            columns[name] = _unpack_array(payload)
+        else:
+            raise ValueError(f"snapshot: sección desconocida {name!r}")
+    return digest, (size, mtime_ns), tables, columns
+
+
+class SnapshotCache:
+    """
+    Caché en disco de índices BC3 ya parseados.
+
+    La clave es el hash del contenido (blake2b) más tamaño y mtime del
+    fichero. Al superar `max_bytes` se borran las instantáneas usadas hace
+    más tiempo (LRU por mtime de la propia instantánea, que se toca en cada
+    acierto).
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, digest: str, stamp: Tuple[int, int]) -> Path:
+        size, mtime_ns = stamp
+        return self.directory / f"{digest}-{size}-{mtime_ns}{_SUFFIX}"
+
+    def load(self, path: Path, *, jobs: Optional[int] = None) -> Bc3Index:
+        """Índice de `path`, desde la caché si existe; si no, se parsea y se guarda."""
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(path)
+        stat = path.stat()
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        buf = open_bc3_buffer(path)
+        try:
+            digest = content_digest(buf)
+            index = self._read(path, stamp, digest, buf)
+        except BaseException:
+            close_bc3_buffer(buf)
+            raise
+        if index is not None:
+            return index
+
+        index = Bc3Index.from_buffer(buf, path, stamp, jobs=jobs)
+        self._write(index, digest)
+        return index
+
+    def store(self, index: Bc3Index) -> None:
+        """Guarda `index` si corresponde al fichero tal y como está en disco."""
+        if not index.is_fresh() or index.stamp is None:
+            return
+        if len(index.buffer) != index.stamp[0]:
+            # Escrito con otros saltos de línea: los offsets no valen para el fichero.
+            return
+        self._write(index, content_digest(index.buffer))
+
+    def _read(
+        self,
+        path: Path,
+        stamp: Tuple[int, int],
+        digest: str,
+        buf: Buffer,
+    ) -> Optional[Bc3Index]:
+        entry = self._entry_path(digest, stamp)
+        if not entry.exists():
+            return None
+        try:
+            snap_digest, snap_stamp, tables, columns = read_snapshot(entry)
+            if snap_digest != digest or snap_stamp != stamp:
+                return None
+            index = Bc3Index.from_state(path, stamp, buf, tables, columns)
+        except (OSError, ValueError, KeyError, struct.error):
+            entry.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return index
+
+    def _write(self, index: Bc3Index, digest: str) -> None:
+        assert index.stamp is not None
+        try:
+            write_snapshot(index, self._entry_path(digest, index.stamp), digest)
+            self.evict()
+        except OSError:
+            # La caché es opcional: si no se puede escribir, se sigue sin ella.
+            pass
+
+    def evict(self) -> None:
+        entries = []
+        for entry in self.directory.glob(f"*{_SUFFIX}"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+        entries.sort()
+        total = sum(size for _mtime, size, _entry in entries)
+        for _mtime, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+
+def default_snapshot_cache() -> Optional[SnapshotCache]:
+    from config.settings import Settings
+
+    settings = Settings()
+    if not settings.bc3_cache_enabled:
+        return None
+    directory = (
+        Path(settings.bc3_cache_dir)
+        if settings.bc3_cache_dir
+        else Path(tempfile.gettempdir()) / "bc3_snapshots"
+    )
+    return SnapshotCache(directory, settings.bc3_cache_max_mb * 1024 * 1024)
+
+
+def load_bc3_index(
+    path: Path,
+    cache: Optional[SnapshotCache] = None,
+    *,
+    jobs: Optional[int] = None,
+) -> Bc3Index:
+    if jobs is None:
+        from config.settings import Settings
+
+        jobs = Settings().bc3_jobs
+    cache = cache if cache is not None else default_snapshot_cache()
+    if cache is None:
+        return Bc3Index.from_path(path, jobs=jobs)
+    return cache.load(path, jobs=jobs)
+
+
+def store_bc3_index(index: Bc3Index, cache: Optional[SnapshotCache] = None) -> None:
+    cache = cache if cache is not None else default_snapshot_cache()
+    if cache is not None:
+        cache.store(index)
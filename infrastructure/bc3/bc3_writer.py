@@ -0,0 +1,93 @@
+# infrastructure/bc3/bc3_writer.py
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Callable, List, Optional
+
+# Bytes que `clean_text` deja igual: ASCII imprimible y saltos de línea, sin
+# dobles espacios (NFKC no cambia nada en ASCII).
+_DIRTY_BYTES_RE = re.compile(rb"[^\x20-\x7e\n]|  ")
+
+
+def normalize_newlines(raw: bytes) -> bytes:
+    """Mismos saltos de línea que la lectura en modo texto (universal newlines)."""
+    if b"\r" in raw:
+        raw = raw.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return raw
+
+
+def is_clean_record(raw: bytes) -> bool:
+    """
+    True si `clean_text(registro) + "\\n"` devolvería exactamente `raw`, es
+    decir, si el registro se puede copiar tal cual sin pasar por `clean_text`.
+    `raw` debe tener ya los saltos de línea normalizados.
+    """
+    if len(raw) < 2 or raw[-1:] != b"\n" or raw[0] <= 0x20 or raw[-2] <= 0x20:
+        return False
+    return _DIRTY_BYTES_RE.search(raw) is None
+
+
+def write_bc3_bytes(path: Path, data: bytes, *, atomic: bool = False) -> None:
+    """
+    Escribe `data` (con saltos "\\n") usando los saltos de línea del sistema.
+    Con `atomic` se escribe a un temporal en la misma carpeta y se renombra,
+    de modo que nunca queda un fichero a medias.
+    """
+    if os.linesep != "\n":
+        data = data.replace(b"\n", os.linesep.encode("ascii"))
+    path = Path(path)
+    if not atomic:
+        path.write_bytes(data)
+        return
+
+    mode = path.stat().st_mode & 0o777 if path.exists() else 0o644
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.chmod(tmp_name, mode)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class Bc3Writer:
+    """
+    Acumula la salida de un BC3 en bytes latin-1. Los registros que no
+    cambian se copian tal cual desde el buffer de origen (`copy`); solo los
+    modificados se serializan (`write`).
+
+    `postprocess`, si se indica, se aplica a los bytes de cada registro
+    (copiado o escrito) antes de acumularlo.
+    """
+
+    def __init__(self, postprocess: Optional[Callable[[bytes], bytes]] = None) -> None:
+        self._parts: List[bytes] = []
+        self._postprocess = postprocess
+        self.copied = 0
+        self.written = 0
+
+    def copy(self, raw: bytes) -> None:
+        raw = normalize_newlines(raw)
+        if self._postprocess is not None:
+            raw = self._postprocess(raw)
+        self._parts.append(raw)
+        self.copied += 1
+
+    def write(self, text: str) -> None:
+        if text:
+            data = text.encode("latin-1", errors="ignore")
+            if self._postprocess is not None:
+                data = self._postprocess(data)
+            self._parts.append(data)
+        self.written += 1
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._parts)
+
+    def write_to(self, path: Path, *, atomic: bool = False) -> None:
+        write_bc3_bytes(path, self.getvalue(), atomic=atomic)
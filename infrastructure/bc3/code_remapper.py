@@ -0,0 +1,61 @@
+# infrastructure/bc3/code_remapper.py
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Mapping, Optional
+
+# Separadores de campo ("|"), subcampo ("\\") y línea dentro de un registro.
+_TOKEN_SPLIT_RE = re.compile(rb"([|\\\r\n])")
+
+
+class CodeRemapper:
+    """
+    Renombra códigos en registros BC3 de cualquier tipo (~C, ~D, ~M, ~T,
+    ~K, ...). El registro se trocea por los separadores `|` y `\\`, y cada
+    trozo se busca tal cual en el diccionario, así que el coste depende del
+    tamaño del registro y no del número de códigos a renombrar.
+
+    Trabaja sobre bytes latin-1 para no decodificar los registros que no
+    cambian.
+    """
+
+    __slots__ = ("_map",)
+
+    def __init__(self, mapping: Mapping[str, str]) -> None:
+        self._map: Dict[bytes, bytes] = {
+            old.encode("latin-1", errors="ignore"): new.encode("latin-1", errors="ignore")
+            for old, new in mapping.items()
+            if old != new
+        }
+
+    def __bool__(self) -> bool:
+        return bool(self._map)
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def _tokens(self, raw: bytes) -> Optional[List[bytes]]:
+        if not self._map:
+            return None
+        tokens = _TOKEN_SPLIT_RE.split(raw)
+        if self._map.keys().isdisjoint(tokens):
+            return None
+        return tokens
+
+    def touches(self, raw: bytes) -> bool:
+        """True si algún código del registro está en el diccionario."""
+        return self._tokens(raw) is not None
+
+    def remap(self, raw: bytes) -> Optional[bytes]:
+        """Registro con los códigos renombrados, o None si no cambia nada."""
+        tokens = self._tokens(raw)
+        if tokens is None:
+            return None
+        get = self._map.get
+        # Los separadores están en las posiciones impares.
+        tokens[::2] = [get(token, token) for token in tokens[::2]]
+        return b"".join(tokens)
+
+    def remap_text(self, line: str) -> str:
+        remapped = self.remap(line.encode("latin-1", errors="ignore"))
+        return line if remapped is None else remapped.decode("latin-1")
@@ -0,0 +1,345 @@
+# infrastructure/bc3/concept_store.py
+from __future__ import annotations
+
+import math
+import re
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+NAN = float("nan")
+NO_ID = -1
+
+_NUM = re.compile(r"^-?\d+(?:[.,]\d+)?$")
+
+
+def parse_num(value: str) -> float:
+    """Número BC3 ("1,5" o "1.5") o NaN si el texto no es un número."""
+    return float(value.replace(",", ".")) if value and _NUM.match(value) else NAN
+
+
+def concept_values(
+    parts: List[str],
+) -> Tuple[str, int, Optional[str], float, Optional[str]]:
+    """(código, nº de campos, unidad, precio, tipo) de los campos de un ~C."""
+    n = len(parts)
+    return (
+        parts[0],
+        n,
+        parts[1] if n > 1 else None,
+        parse_num(parts[3]) if n > 3 else NAN,
+        parts[5] if n > 5 else None,
+    )
+
+
+class _Interner:
+    __slots__ = ("values", "ids")
+
+    def __init__(self) -> None:
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def intern(self, value: str) -> int:
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = len(self.values)
+            self.ids[value] = idx
+            self.values.append(value)
+        return idx
+
+
+class ConceptStore:
+    """
+    Conceptos de un BC3 en columnas (struct-of-arrays).
+
+    Cada código recibe un id entero la primera vez que aparece (en un ~C o como
+    hijo de un ~D). Por id se guardan el último ~C (número de registro), su
+    tipo, unidad y precio; descripción, fecha y precio literal se leen del
+    registro cuando se piden. Las aristas ~D van en arrays paralelos en orden
+    de fichero y los hijos de cada padre en formato CSR.
+    """
+
+    COLUMNS = (
+        "record",
+        "nfields",
+        "tipo",
+        "unit",
+        "price",
+        "text_record",
+        "order",
+        "edge_parent",
+        "edge_child",
+        "edge_qty",
+    )
+    TABLES = ("codes", "tipos", "units")
+
+    def __init__(self) -> None:
+        self._codes = _Interner()
+        self._tipos = _Interner()
+        self._units = _Interner()
+
+        self.record = array("q")
+        self.nfields = array("h")
+        self.tipo = array("h")
+        self.unit = array("l")
+        self.price = array("d")
+        self.text_record = array("q")
+        self.order = array("l")
+
+        self.edge_parent = array("l")
+        self.edge_child = array("l")
+        self.edge_qty = array("d")
+
+        self._child_ptr: Optional[array] = None
+        self._child_edges: Optional[array] = None
+
+    def __len__(self) -> int:
+        return len(self._codes.values)
+
+    def tables(self) -> Dict[str, List[str]]:
+        return {
+            "codes": self._codes.values,
+            "tipos": self._tipos.values,
+            "units": self._units.values,
+        }
+
+    def columns(self) -> Dict[str, array]:
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    @classmethod
+    def from_state(
+        cls,
+        tables: Mapping[str, List[str]],
+        columns: Mapping[str, array],
+    ) -> "ConceptStore":
+        store = cls()
+        for name, interner in (
+            ("codes", store._codes),
+            ("tipos", store._tipos),
+            ("units", store._units),
+        ):
+            interner.values = list(tables[name])
+            interner.ids = {value: i for i, value in enumerate(interner.values)}
+        for name in cls.COLUMNS:
+            column = columns[name]
+            if column.typecode != getattr(store, name).typecode:
+                raise ValueError(f"ConceptStore: columna {name!r} con tipo inesperado")
+            setattr(store, name, column)
+        return store
+
+    @property
+    def codes(self) -> List[str]:
+        return self._codes.values
+
+    def id_of(self, code: str) -> int:
+        return self._codes.ids.get(code, NO_ID)
+
+    def code_of(self, cid: int) -> str:
+        return self._codes.values[cid]
+
+    def intern(self, code: str) -> int:
+        cid = self._codes.ids.get(code)
+        if cid is not None:
+            return cid
+        cid = self._codes.intern(code)
+        self.record.append(-1)
+        self.nfields.append(0)
+        self.tipo.append(NO_ID)
+        self.unit.append(NO_ID)
+        self.price.append(NAN)
+        self.text_record.append(-1)
+        return cid
+
+    def is_concept(self, cid: int) -> bool:
+        return cid >= 0 and self.record[cid] >= 0
+
+    def tipo_of(self, cid: int) -> str:
+        tipo_id = self.tipo[cid] if cid >= 0 else NO_ID
+        return self._tipos.values[tipo_id] if tipo_id >= 0 else ""
+
+    def unit_of(self, cid: int) -> str:
+        unit_id = self.unit[cid] if cid >= 0 else NO_ID
+        return self._units.values[unit_id] if unit_id >= 0 else ""
+
+    def price_of(self, cid: int) -> Optional[float]:
+        value = self.price[cid]
+        return None if math.isnan(value) else value
+
+    def add_concept(self, rec_no: int, parts: List[str]) -> int:
+        return self.add_concept_values(rec_no, *concept_values(parts))
+
+    def add_concept_values(
+        self,
+        rec_no: int,
+        code: str,
+        nfields: int,
+        unit: Optional[str],
+        price: float,
+        tipo: Optional[str],
+    ) -> int:
+        cid = self.intern(code)
+        self.set_concept(
+            cid,
+            rec_no,
+            nfields,
+            self.intern_unit(unit) if unit is not None else NO_ID,
+            price,
+            self.intern_tipo(tipo) if tipo is not None else NO_ID,
+        )
+        return cid
+
+    def set_concept(
+        self,
+        cid: int,
+        rec_no: int,
+        nfields: int,
+        unit_id: int,
+        price: float,
+        tipo_id: int,
+    ) -> None:
+        if self.record[cid] < 0:
+            self.order.append(cid)
+        self.record[cid] = rec_no
+        self.nfields[cid] = min(nfields, 32767)
+        self.unit[cid] = unit_id
+        self.price[cid] = price
+        self.tipo[cid] = tipo_id
+
+    def intern_unit(self, unit: str) -> int:
+        return self._units.intern(unit)
+
+    def intern_tipo(self, tipo: str) -> int:
+        return self._tipos.intern(tipo)
+
+    def add_edge(self, parent: int, child: int, qty: float) -> None:
+        self.edge_parent.append(parent)
+        self.edge_child.append(child)
+        self.edge_qty.append(qty)
+        self._child_ptr = None
+
+    def extend_edges(self, parents: Iterable[int], children: Iterable[int], qtys: array) -> None:
+        self.edge_parent.extend(parents)
+        self.edge_child.extend(children)
+        self.edge_qty.extend(qtys)
+        self._child_ptr = None
+
+    def children_edges(self, cid: int) -> array:
+        """Índices de las aristas ~D de `cid`, en orden de fichero."""
+        if self._child_ptr is None:
+            self._child_ptr, self._child_edges = csr_groups(self.edge_parent, len(self))
+        assert self._child_edges is not None
+        return self._child_edges[self._child_ptr[cid] : self._child_ptr[cid + 1]]
+
+    def children_ids(self, cid: int) -> List[int]:
+        edge_child = self.edge_child
+        return [edge_child[e] for e in self.children_edges(cid)]
+
+
+def csr_groups(keys: array, size: int) -> tuple[array, array]:
+    """Agrupa posiciones por clave (counting sort estable)."""
+    counts = array("q", bytes(8 * (size + 1)))
+    for key in keys:
+        counts[key + 1] += 1
+    for i in range(size):
+        counts[i + 1] += counts[i]
+    ptr = array("q", counts)
+    fill = array("q", counts)
+    out = array("q", bytes(8 * len(keys)))
+    for pos, key in enumerate(keys):
+        out[fill[key]] = pos
+        fill[key] += 1
+    return ptr, out
+
+
+class ConceptView:
+    """Vista ligera de un concepto del `ConceptStore`."""
+
+    __slots__ = ("_store", "_fields_of", "_text_of", "cid")
+
+    def __init__(
+        self,
+        store: ConceptStore,
+        cid: int,
+        fields_of: Callable[[int], List[str]],
+        text_of: Callable[[int], Optional[str]],
+    ) -> None:
+        self._store = store
+        self._fields_of = fields_of
+        self._text_of = text_of
+        self.cid = cid
+
+    @property
+    def code(self) -> str:
+        return self._store.code_of(self.cid)
+
+    @property
+    def fields(self) -> List[str]:
+        return self._fields_of(self.cid)
+
+    @property
+    def nfields(self) -> int:
+        return self._store.nfields[self.cid]
+
+    @property
+    def unidad(self) -> str:
+        return self._store.unit_of(self.cid)
+
+    @property
+    def desc_short(self) -> str:
+        fields = self.fields
+        return fields[2] if len(fields) > 2 else ""
+
+    @property
+    def price_txt(self) -> str:
+        fields = self.fields
+        return fields[3] if len(fields) > 3 else ""
+
+    @property
+    def precio(self) -> Optional[float]:
+        return self._store.price_of(self.cid)
+
+    @property
+    def tipo(self) -> str:
+        return self._store.tipo_of(self.cid)
+
+    @property
+    def long_desc(self) -> Optional[str]:
+        return self._text_of(self.cid)
+
+    def __repr__(self) -> str:
+        return f"ConceptView({self.code!r}, tipo={self.tipo!r})"
+
+
+class ConceptMapping(Mapping[str, ConceptView]):
+    """Código -> `ConceptView`, en el orden del primer ~C de cada código."""
+
+    def __init__(
+        self,
+        store: ConceptStore,
+        fields_of: Callable[[int], List[str]],
+        text_of: Callable[[int], Optional[str]],
+    ) -> None:
+        self._store = store
+        self._fields_of = fields_of
+        self._text_of = text_of
+
+    def view(self, cid: int) -> ConceptView:
+        return ConceptView(self._store, cid, self._fields_of, self._text_of)
+
+    def __getitem__(self, code: str) -> ConceptView:
+        cid = self._store.id_of(code)
+        if not self._store.is_concept(cid):
+            raise KeyError(code)
+        return self.view(cid)
+
+    def __contains__(self, code: object) -> bool:
+        return isinstance(code, str) and self._store.is_concept(
+            self._store.id_of(code)
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        codes = self._store.codes
+        for cid in self._store.order:
+            yield codes[cid]
+
+    def __len__(self) -> int:
+        return len(self._store.order)
@@ -107,6 +107,16 @@ def _load_local_dotenv_once() -> None:
     _load_local_dotenv_once._done = True
 
 
+def resolve_model_name() -> str:
+    """Modelo LLM con el que clasificará la librería (el que elige la GUI)."""
+    _load_local_dotenv_once()
+    return (
+        os.getenv("OPENAI_MODEL_NAME")
+        or os.getenv("OPENAI_MODEL")
+        or "gpt-5.2"
+    ).strip()
+
+
 def _read_first_int_env(names: list[str], default: int) -> int:
     for name in names:
         raw = os.getenv(name)
@@ -154,13 +164,7 @@ class Bc3ClassifierLibraryClient:
 
     @classmethod
     def from_env(cls) -> "Bc3ClassifierLibraryClient":
-        _load_local_dotenv_once()
-
-        model_name = (
-            os.getenv("OPENAI_MODEL_NAME")
-            or os.getenv("OPENAI_MODEL")
-            or "gpt-5.2"
-        ).strip()
+        model_name = resolve_model_name()
 
         llm_batch_size = _read_first_int_env(
             [
@@ -2,7 +2,6 @@
 from __future__ import annotations
 from pathlib import Path
 from typing import List, Dict
-import pandas as pd
 
 
 def load_catalog(excel_path: Path) -> List[Dict[str, str]]:
@@ -12,6 +11,8 @@ def load_catalog(excel_path: Path) -> List[Dict[str, str]]:
     """
     if not excel_path.exists():
         raise FileNotFoundError(excel_path)
+    import pandas as pd
+
     df = pd.read_excel(excel_path, engine="openpyxl")
     if df.shape[1] < 2:
         raise ValueError("El Excel debe tener al menos 2 columnas: código y descripción.")
@@ -5,13 +5,15 @@ from dataclasses import replace
 
 from application.pipeline.pipeline import ETLContext, Pipeline
 from application.pipeline.steps import (
-    BuildTreeStep,
+    ExportColumnarStep,
     ExportCsvStep,
+    ExportXlsxStep,
+    Phase1Step,
     PrintTreeStep,
     ResolveInputStep,
-    TransformBC3Step,
 )
 from config.settings import Settings
+from utils.memo import memo_report
 from utils.timer import Stopwatch
 
 
@@ -20,18 +22,44 @@ def run_etl(
     *,
     show_tree: bool = True,
     export_csv: bool = True,
+    jobs: int | None = None,
+    tree_depth: int | None = None,
+    tree_max_nodes: int | None = None,
+    tree_subtrees: str | None = None,
 ) -> None:
     sw = Stopwatch()
     settings = Settings()
     if input_filename:
         settings = replace(settings, input_filename=input_filename)
+    if jobs is not None:
+        settings = replace(settings, bc3_jobs=jobs)
+    if tree_depth is not None:
+        settings = replace(settings, tree_max_depth=tree_depth)
+    if tree_max_nodes is not None:
+        settings = replace(settings, tree_max_nodes=tree_max_nodes)
+    if tree_subtrees is not None:
+        settings = replace(settings, tree_subtrees=tree_subtrees)
 
-    pipeline = Pipeline().add(ResolveInputStep()).add(TransformBC3Step()).add(BuildTreeStep())
+    pipeline = Pipeline().add(ResolveInputStep()).add(Phase1Step())
     if show_tree:
-        pipeline.add(PrintTreeStep())
+        pipeline.add(
+            PrintTreeStep(
+                max_depth=settings.tree_max_depth or None,
+                max_nodes=settings.tree_max_nodes or None,
+                subtrees=tuple(
+                    code.strip() for code in settings.tree_subtrees.split(",") if code.strip()
+                ),
+            )
+        )
     if export_csv:
         pipeline.add(ExportCsvStep())
+    if settings.xlsx_filename:
+        pipeline.add(ExportXlsxStep())
+    if settings.columnar_filename:
+        pipeline.add(ExportColumnarStep())
 
     ctx = ETLContext(settings=settings)
     pipeline.run(ctx)
     print(sw.report("ETL – tiempos"))
+    if settings.log_level.upper() == "DEBUG":
+        print(memo_report("ETL – memos"))
@@ -1,24 +1,27 @@
 # interface_adapters/gui/gui_app.py
 from __future__ import annotations
 
+import importlib.util
 import os
 import sys
 import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
-from application.services.build_tree_service import build_tree
-from application.services.export_csv_service import export_to_csv
-from infrastructure.bc3.bc3_modifier import convert_to_material
+if TYPE_CHECKING:
+    from infrastructure.bc3.bc3_index import Bc3Index
 
+# Fase 1, fase 2 (SDK de IA, catálogo, openpyxl) e índice BC3 se importan al
+# pulsar cada botón: la ventana abre sin cargarlos. Aquí solo se comprueba que
+# la fase 2 está empaquetada.
 try:
-    from application.services.phase2_code_mapper import run_phase2
-
-    HAS_PHASE2 = True
+    HAS_PHASE2 = (
+        importlib.util.find_spec("application.services.phase2_code_mapper") is not None
+    )
 except Exception:
     HAS_PHASE2 = False
 
@@ -106,6 +109,7 @@ class App(tk.Tk):
         self.input_path: Optional[Path] = None
         self.refcru_template_path: Optional[Path] = None
         self.last_output_dir: Optional[Path] = None
+        self.cleaned_index: Optional[Bc3Index] = None
         self.model_name: str = DEFAULT_MODEL
         self.model_limits = MODEL_PRESETS[self.model_name].copy()
 
@@ -540,14 +544,18 @@ class App(tk.Tk):
             cleaned_bc3 = self._cleaned_bc3_path()
             tree_csv = out_dir / f"{src.stem}_tree.csv"
 
-            self._append_async(f"Normalizando BC3 → {cleaned_bc3.name}")
-            convert_to_material(src, cleaned_bc3)
+            from application.services.export_csv_service import export_to_csv
+            from application.services.phase1_service import run_phase1
 
+            self.cleaned_index = None
             self._append_async(
-                f"Construyendo árbol y exportando CSV → {tree_csv.name}"
+                f"Normalizando BC3 y construyendo árbol → {cleaned_bc3.name}"
             )
-            roots = build_tree(cleaned_bc3)
-            export_to_csv(roots, tree_csv)
+            result = run_phase1(src, cleaned_bc3)
+
+            self._append_async(f"Exportando CSV → {tree_csv.name}")
+            export_to_csv(result.roots, tree_csv)
+            self.cleaned_index = result.index
 
             self._append_async(f"Guardado: {cleaned_bc3}")
             self._append_async(f"Guardado: {tree_csv}")
@@ -559,18 +567,24 @@ class App(tk.Tk):
             self._enable_actions()
             self._append_banner_async("TERMINADO" if ok else "FAIL", ok=ok)
 
+    def _index_for(self, path: Path) -> Bc3Index:
+        index = self.cleaned_index
+        if index is not None and index.path == path and index.is_fresh():
+            return index
+        from infrastructure.bc3.bc3_snapshot import load_bc3_index
+
+        index = load_bc3_index(path)
+        self.cleaned_index = index
+        return index
+
     @staticmethod
-    def _count_descompuestos_in_bc3(path: Path) -> int:
-        total = 0
-        with path.open("r", encoding="latin-1", errors="ignore") as fh:
-            for raw in fh:
-                if raw.startswith("~C|"):
-                    parts = raw.rstrip("\n").split("|")
-                    if len(parts) >= 7:
-                        tipo = parts[6]
-                        if tipo in {"1", "2", "3"}:
-                            total += 1
-        return total
+    def _count_descompuestos_in_bc3(index: Bc3Index) -> int:
+        store = index.store
+        return sum(
+            1
+            for cid in store.order
+            if store.nfields[cid] >= 6 and store.tipo_of(cid) in {"1", "2", "3"}
+        )
 
     @staticmethod
     def _format_progress_event(ev: Any, idx: int, total: int) -> str:
@@ -599,8 +613,11 @@ class App(tk.Tk):
     def _run_phase2_thread(self, cleaned_bc3: Path) -> None:
         ok = True
         try:
+            from application.services.phase2_code_mapper import run_phase2
+
             out_phase2 = cleaned_bc3.with_name(cleaned_bc3.stem + "_clasificado.bc3")
-            total = self._count_descompuestos_in_bc3(cleaned_bc3)
+            index = self._index_for(cleaned_bc3)
+            total = self._count_descompuestos_in_bc3(index)
             self._append_async(f"Detectados {total} descompuestos a procesar.")
 
             processed = 0
@@ -627,6 +644,7 @@ class App(tk.Tk):
                 "rpd_limit": limits["RPD"],
                 "refcru_template_xlsx": self.refcru_template_path,
                 "emit_refcru_xlsx": True,
+                "index": index,
             }
 
             used = False
@@ -1,8 +1,53 @@
 # main.py
+import argparse
+
+from config.runtime_env import freeze_support
 from interface_adapters.controllers.etl_controller import run_etl
 
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ETL de presupuestos BC3 (fase 1).")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="procesos para parsear el BC3 (1 = en serie, 0 = uno por CPU; "
+        "por defecto BC3_JOBS)",
+    )
+    parser.add_argument(
+        "--tree-depth",
+        type=int,
+        default=None,
+        metavar="N",
+        help="niveles del árbol que se imprimen (0 = todos; por defecto TREE_MAX_DEPTH)",
+    )
+    parser.add_argument(
+        "--tree-max-nodes",
+        type=int,
+        default=None,
+        metavar="N",
+        help="nodos del árbol que se imprimen como máximo (0 = todos; por defecto TREE_MAX_NODES)",
+    )
+    parser.add_argument(
+        "--tree-subtrees",
+        default=None,
+        metavar="CODIGOS",
+        help="imprime solo los subárboles de estos códigos, separados por comas "
+        "(por defecto TREE_SUBTREES)",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    run_etl()
+    freeze_support()
+    args = _parse_args()
+    run_etl(
+        jobs=args.jobs,
+        tree_depth=args.tree_depth,
+        tree_max_nodes=args.tree_max_nodes,
+        tree_subtrees=args.tree_subtrees,
+    )
 
 
 #TODO: arreglar %
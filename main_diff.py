@@ -0,0 +1,41 @@
+# main_diff.py
+import argparse
+from pathlib import Path
+
+from application.services.tree_diff_service import diff_bc3
+from config.runtime_env import freeze_support
+
+
+def _fmt(value) -> str:
+    return "" if value is None else f"{value:+.6g}"
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Conceptos añadidos, eliminados y modificados entre dos BC3."
+    )
+    parser.add_argument("old_bc3", type=Path, help="revisión anterior")
+    parser.add_argument("new_bc3", type=Path, help="revisión nueva")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    freeze_support()
+    args = _parse_args()
+    diff = diff_bc3(args.old_bc3, args.new_bc3)
+
+    for change in diff.added:
+        print(f"+ {change.code:<20} {change.kind:<14} {change.description}")
+    for change in diff.removed:
+        print(f"- {change.code:<20} {change.kind:<14} {change.description}")
+    for change in diff.modified:
+        print(
+            f"~ {change.code:<20} {change.kind:<14} {','.join(change.fields):<24} "
+            f"precio {_fmt(change.precio_delta)}  "
+            f"cantidad {_fmt(change.cantidad_delta)}  "
+            f"importe {_fmt(change.importe_delta)}"
+        )
+    print(
+        f"\n{len(diff.added)} añadidos, {len(diff.removed)} eliminados, "
+        f"{len(diff.modified)} modificados ({diff.skipped_subtrees} subárboles sin cambios)"
+    )
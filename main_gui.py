@@ -1,7 +1,7 @@
 # main_gui.py
 from __future__ import annotations
 
-from config.runtime_env import load_runtime_dotenv
+from config.runtime_env import freeze_support, load_runtime_dotenv
 
 load_runtime_dotenv()
 
@@ -9,4 +9,5 @@ from interface_adapters.gui.gui_app import run_gui
 
 
 if __name__ == "__main__":
+    freeze_support()
     run_gui()
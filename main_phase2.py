@@ -11,6 +11,7 @@ except Exception:
     pass
 
 from application.services.phase2_code_mapper import run_phase2
+from config.runtime_env import freeze_support
 from utils.timer import timer
 
 # --- Ruta por defecto para la FASE 2: salida de la FASE 1 ---
@@ -34,6 +35,7 @@ def _usage() -> None:
 
 
 if __name__ == "__main__":
+    freeze_support()
     argc = len(sys.argv)
 
     if argc >= 3:
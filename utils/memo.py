@@ -0,0 +1,70 @@
+# utils/memo.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, TypeVar
+
+F = TypeVar("F", bound=Callable[..., object])
+
+_REGISTRY: Dict[str, Callable[..., object]] = {}
+
+
+@dataclass(frozen=True)
+class MemoStats:
+    name: str
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def memoized(name: str, maxsize: int = 4096) -> Callable[[F], F]:
+    """
+    LRU acotado (functools.lru_cache) registrado con `name` para poder
+    consultar aciertos y fallos con `memo_stats()`. Solo para funciones puras
+    de argumentos hashables.
+    """
+
+    def decorate(func: F) -> F:
+        cached = lru_cache(maxsize=maxsize)(func)
+        _REGISTRY[name] = cached
+        return cached  # type: ignore[return-value]
+
+    return decorate
+
+
+def memo_stats() -> List[MemoStats]:
+    stats: List[MemoStats] = []
+    for name, cached in _REGISTRY.items():
+        info = cached.cache_info()  # type: ignore[attr-defined]
+        stats.append(
+            MemoStats(
+                name=name,
+                hits=info.hits,
+                misses=info.misses,
+                size=info.currsize,
+                maxsize=info.maxsize or 0,
+            )
+        )
+    return stats
+
+
+def clear_memos() -> None:
+    for cached in _REGISTRY.values():
+        cached.cache_clear()  # type: ignore[attr-defined]
+
+
+def memo_report(title: str = "Memos") -> str:
+    lines = [f"{title}:"]
+    for stat in memo_stats():
+        lines.append(
+            f"  {stat.name}: {stat.hits} aciertos, {stat.misses} fallos "
+            f"({stat.hit_ratio:.0%}), {stat.size}/{stat.maxsize} entradas"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,180 @@
+# utils/rtf_text.py
+from __future__ import annotations
+
+import codecs
+import re
+from typing import List
+
+# Una sola pasada por el texto: palabra de control (\word[-N][espacio]),
+# escape hexadecimal (\'hh), símbolo de control (\x), llave o texto plano.
+_TOKEN_RE = re.compile(
+    r"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?"
+    r"|\\'([0-9a-fA-F]{2})"
+    r"|\\([^a-zA-Z'])"
+    r"|([{}])"
+    r"|([^\\{}\r\n]+)"
+    r"|[\r\n]+",
+    re.DOTALL,
+)
+
+# Grupos cuyo contenido no es texto del documento.
+_DESTINATIONS = frozenset(
+    {
+        "author",
+        "buptim",
+        "colortbl",
+        "comment",
+        "creatim",
+        "doccomm",
+        "fldinst",
+        "filetbl",
+        "fonttbl",
+        "footer",
+        "footerf",
+        "footerl",
+        "footerr",
+        "footnote",
+        "header",
+        "headerf",
+        "headerl",
+        "headerr",
+        "info",
+        "keywords",
+        "listoverridetable",
+        "listtable",
+        "object",
+        "operator",
+        "pict",
+        "printim",
+        "private",
+        "revtbl",
+        "rsidtbl",
+        "stylesheet",
+        "subject",
+        "title",
+        "xmlnstbl",
+    }
+)
+
+_WORD_TEXT = {
+    "par": " ",
+    "line": " ",
+    "sect": " ",
+    "page": " ",
+    "row": " ",
+    "tab": " ",
+    "cell": " ",
+    "emdash": "\u2014",
+    "endash": "\u2013",
+    "emspace": " ",
+    "enspace": " ",
+    "bullet": "\u2022",
+    "lquote": "\u2018",
+    "rquote": "\u2019",
+    "ldblquote": "\u201c",
+    "rdblquote": "\u201d",
+}
+
+_SYMBOL_TEXT = {
+    "\\": "\\",
+    "{": "{",
+    "}": "}",
+    "~": "\u00a0",
+    "_": "-",
+    "-": "",
+    "\n": " ",
+    "\r": " ",
+}
+
+_DEFAULT_CODEPAGE = "cp1252"
+
+
+def is_rtf(text: str) -> bool:
+    return text.lstrip().startswith("{\\rtf")
+
+
+def _codepage(number: int) -> str:
+    name = f"cp{number}"
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return _DEFAULT_CODEPAGE
+    return name
+
+
+def rtf_to_text(text: str) -> str:
+    """
+    Texto plano de un cuerpo RTF. Descarta tablas de fuentes y colores,
+    cabeceras, imágenes y destinos `\\*`; conserva el texto, los escapes
+    (\\'hh, \\uN, \\\\, \\{, \\}) y convierte párrafos y tabuladores en
+    espacios. El texto que siga al cierre del grupo raíz se devuelve tal
+    cual. Tiempo lineal en la longitud del texto.
+    """
+    out: List[str] = []
+    codepage = _DEFAULT_CODEPAGE
+    uc = 1  # caracteres alternativos que siguen a cada \uN
+    skip_chars = 0
+    skipping = False
+    stack: List[tuple[bool, int]] = []
+
+    for match in _TOKEN_RE.finditer(text):
+        word, arg, hex_code, symbol, brace, plain = match.groups()
+
+        if brace is not None:
+            skip_chars = 0
+            if brace == "{":
+                stack.append((skipping, uc))
+            elif stack:
+                skipping, uc = stack.pop()
+                if not stack:
+                    # Fin del documento: lo que siga no es RTF y se deja tal cual.
+                    return "".join(out).strip() + text[match.end():]
+            continue
+
+        if plain is not None:
+            if skip_chars:
+                consumed = min(skip_chars, len(plain))
+                plain = plain[consumed:]
+                skip_chars -= consumed
+            if plain and not skipping:
+                out.append(plain)
+            continue
+
+        if hex_code is not None:
+            if skip_chars:
+                skip_chars -= 1
+            elif not skipping:
+                out.append(bytes([int(hex_code, 16)]).decode(codepage, errors="replace"))
+            continue
+
+        if symbol is not None:
+            if symbol == "*":
+                skipping = True
+            elif skip_chars:
+                skip_chars -= 1
+            elif not skipping:
+                out.append(_SYMBOL_TEXT.get(symbol, ""))
+            continue
+
+        if word is None:
+            # Saltos de línea del propio fichero RTF: no son texto.
+            continue
+
+        if skip_chars:
+            skip_chars -= 1
+            continue
+        if word in _DESTINATIONS:
+            skipping = True
+        elif word == "uc" and arg is not None:
+            uc = max(0, int(arg))
+        elif word == "u" and arg is not None:
+            if not skipping:
+                code = int(arg)
+                out.append(chr(code + 65536 if code < 0 else code))
+            skip_chars = uc
+        elif word == "ansicpg" and arg is not None:
+            codepage = _codepage(int(arg))
+        elif not skipping:
+            out.append(_WORD_TEXT.get(word, ""))
+
+    return "".join(out).strip()
@@ -3,18 +3,49 @@ from __future__ import annotations
 
 import re
 import unicodedata
+from typing import Iterable, List
 
-_CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+from utils.memo import memoized
+
+# Caracteres que se eliminan tras NFKC: controles C0 (salvo \t, \n, \r), DEL y BOM.
+_DROPPED_CHARS = [*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0x7F, 0xFEFF]
+_DROP_TABLE = dict.fromkeys(_DROPPED_CHARS)
+_DROPPED_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\ufeff]")
 _MULTI_SPACE_RE = re.compile(r"[ \t]+")
 
+# Registros completos casi nunca se repiten: memoizarlos solo desplazaría del
+# LRU las unidades y descripciones cortas, que sí se repiten miles de veces.
+_MEMO_MAX_LEN = 256
+
 
 def clean_text(value: object) -> str:
     if value is None:
         return ""
 
-    text = str(value)
-    text = unicodedata.normalize("NFKC", text)
-    text = text.replace("\ufeff", "")
-    text = _CONTROL_RE.sub("", text)
-    text = _MULTI_SPACE_RE.sub(" ", text)
+    text = value if type(value) is str else str(value)
+    if len(text) <= _MEMO_MAX_LEN:
+        return _clean_text_memo(text)
+    return _clean_text(text)
+
+
+def clean_text_many(values: Iterable[object]) -> List[str]:
+    """
+    `clean_text` de cada valor, en orden. Para los bucles que limpian todas
+    las descripciones de un presupuesto: comparten el memo de `clean_text`,
+    así que las repetidas (unidades, resúmenes copiados) se limpian una vez.
+    """
+    return [clean_text(value) for value in values]
+
+
+def _clean_text(text: str) -> str:
+    # NFKC no cambia nada en ASCII; en el resto se aplica siempre.
+    if not text.isascii():
+        text = unicodedata.normalize("NFKC", text)
+    if _DROPPED_RE.search(text):
+        text = text.translate(_DROP_TABLE)
+    if "\t" in text or "  " in text:
+        text = _MULTI_SPACE_RE.sub(" ", text)
     return text.strip()
+
+
+_clean_text_memo = memoized("clean_text", maxsize=65536)(_clean_text)